@@ -96,4 +96,4 @@ class PlaceReviewList(Resource):
         reviews = facade.get_reviews_by_place(place_id)
         if not reviews:
             return {"error": "Place not found"}, 404
-        return [{"id": review.id, "text": review.text, "rating": review.rating, "user_id": review.user_id} for review in facade.get_place(place_id).reviews], 200
+        return [{"id": review.id, "text": review.text, "rating": review.rating, "user_id": review.user_id} for review in reviews], 200
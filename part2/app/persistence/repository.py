@@ -27,11 +27,42 @@ class Repository(ABC):
 
 
 class InMemoryRepository(Repository):
-    def __init__(self):
+    def __init__(self, unique_indexes=(), indexes=()):
+        """
+        unique_indexes: attributes whose value identifies a single object (e.g. email)
+        indexes: attributes shared by several objects (e.g. place_id of reviews)
+        Lookups on these attributes are dict accesses instead of scans of the storage.
+        """
         self._storage = {}
+        self._unique_indexes = {attr: {} for attr in unique_indexes}
+        self._indexes = {attr: {} for attr in indexes}
+
+    def _index(self, obj):
+        for attr, index in self._unique_indexes.items():
+            index[getattr(obj, attr)] = obj
+        for attr, index in self._indexes.items():
+            index.setdefault(getattr(obj, attr), {})[obj.id] = obj
+
+    def _unindex(self, obj):
+        for attr, index in self._unique_indexes.items():
+            index.pop(getattr(obj, attr), None)
+        for attr, index in self._indexes.items():
+            bucket = index.get(getattr(obj, attr), {})
+            bucket.pop(obj.id, None)
+            if not bucket:
+                index.pop(getattr(obj, attr), None)
+
+    def _check_unique(self, obj_id, values):
+        for attr, index in self._unique_indexes.items():
+            if attr in values:
+                other = index.get(values[attr])
+                if other is not None and other.id != obj_id:
+                    raise ValueError(f"{attr} is already used")
 
     def add(self, obj):
+        self._check_unique(obj.id, {attr: getattr(obj, attr) for attr in self._unique_indexes})
         self._storage[obj.id] = obj
+        self._index(obj)
 
     def get(self, obj_id):
         return self._storage.get(obj_id)
@@ -42,11 +73,27 @@ class InMemoryRepository(Repository):
     def update(self, obj_id, data):
         obj = self.get(obj_id)
         if obj:
-            obj.update(data)
+            self._check_unique(obj_id, data)
+            self._unindex(obj)
+            try:
+                obj.update(data)
+            finally:
+                self._index(obj)
 
     def delete(self, obj_id):
         if obj_id in self._storage:
-            del self._storage[obj_id]
+            self._unindex(self._storage.pop(obj_id))
 
     def get_by_attribute(self, attr_name, attr_value):
+        if attr_name == "id":
+            return self.get(attr_value)
+        if attr_name in self._unique_indexes:
+            return self._unique_indexes[attr_name].get(attr_value)
+        if attr_name in self._indexes:
+            return next(iter(self._indexes[attr_name].get(attr_value, {}).values()), None)
         return next((obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value), None)
+
+    def get_all_by_attribute(self, attr_name, attr_value):
+        if attr_name in self._indexes:
+            return list(self._indexes[attr_name].get(attr_value, {}).values())
+        return [obj for obj in self._storage.values() if getattr(obj, attr_name) == attr_value]
@@ -12,9 +12,9 @@ class HBnBFacade:
         return cls.INSTANCE
 
     def __init__(self):
-        self.user_repo = InMemoryRepository()
-        self.place_repo = InMemoryRepository()
-        self.review_repo = InMemoryRepository()
+        self.user_repo = InMemoryRepository(unique_indexes=("email",))
+        self.place_repo = InMemoryRepository(indexes=("owner",))
+        self.review_repo = InMemoryRepository(indexes=("place_id", "user_id"))
         self.amenity_repo = InMemoryRepository()
 
     # User facade
@@ -63,6 +63,9 @@ class HBnBFacade:
     def get_place_by_user(self, user_id):
         return self.place_repo.get_by_attribute("id", user_id)
 
+    def get_places_by_owner(self, owner_id):
+        return self.place_repo.get_all_by_attribute("owner", owner_id)
+
     def update_place(self, place_id, place_data):
         return self.place_repo.update(place_id, place_data)
 
@@ -81,7 +84,7 @@ class HBnBFacade:
         return self.review_repo.get_all()
 
     def get_reviews_by_place(self, place_id):
-        return self.review_repo.get_by_attribute('place_id', place_id)
+        return self.review_repo.get_all_by_attribute('place_id', place_id)
 
     def update_review(self, review_id, review_data):
         return self.review_repo.update(review_id, review_data)
@@ -0,0 +1,63 @@
+import sys
+sys.path.append("..")
+
+from app.models.user import User
+from app.models.review import Review
+from app.persistence.repository import InMemoryRepository
+import unittest
+
+# Support the indexes of the in-memory repository
+
+class TestUniqueIndex(unittest.TestCase):
+    def setUp(self):
+        self.repo = InMemoryRepository(unique_indexes=("email",))
+        self.user = User(first_name="John", last_name="Doe", email="john@example.com")
+        self.repo.add(self.user)
+
+    def test_get_by_unique_attribute(self):
+        self.assertIs(self.repo.get_by_attribute("email", "john@example.com"), self.user)
+        self.assertIsNone(self.repo.get_by_attribute("email", "jane@example.com"))
+
+    def test_duplicate_value(self):
+        with self.assertRaises(ValueError):
+            self.repo.add(User(first_name="Jane", last_name="Doe", email="john@example.com"))
+
+    def test_update_reindexes(self):
+        self.repo.update(self.user.id, {"email": "jane@example.com"})
+        self.assertIsNone(self.repo.get_by_attribute("email", "john@example.com"))
+        self.assertIs(self.repo.get_by_attribute("email", "jane@example.com"), self.user)
+
+    def test_update_to_used_value(self):
+        other = User(first_name="Jane", last_name="Doe", email="jane@example.com")
+        self.repo.add(other)
+        with self.assertRaises(ValueError):
+            self.repo.update(other.id, {"email": "john@example.com"})
+        self.assertIs(self.repo.get_by_attribute("email", "jane@example.com"), other)
+
+    def test_delete_unindexes(self):
+        self.repo.delete(self.user.id)
+        self.assertIsNone(self.repo.get_by_attribute("email", "john@example.com"))
+
+class TestIndex(unittest.TestCase):
+    def setUp(self):
+        self.repo = InMemoryRepository(indexes=("place_id",))
+        self.reviews = [Review(text="Nice", rating=5, place_id="place", user_id="user") for _ in range(3)]
+        for review in self.reviews:
+            self.repo.add(review)
+
+    def test_get_all_by_attribute(self):
+        self.assertEqual(self.repo.get_all_by_attribute("place_id", "place"), self.reviews)
+        self.assertEqual(self.repo.get_all_by_attribute("place_id", "other"), [])
+        self.assertIs(self.repo.get_by_attribute("place_id", "place"), self.reviews[0])
+
+    def test_update_and_delete(self):
+        self.repo.update(self.reviews[0].id, {"place_id": "other"})
+        self.repo.delete(self.reviews[1].id)
+        self.assertEqual(self.repo.get_all_by_attribute("place_id", "place"), [self.reviews[2]])
+        self.assertEqual(self.repo.get_all_by_attribute("place_id", "other"), [self.reviews[0]])
+
+    def test_not_indexed_attribute(self):
+        self.assertEqual(self.repo.get_all_by_attribute("user_id", "user"), self.reviews)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,13 @@
 from flask import Flask
 from flask_restx import Api
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import config
+import os
 
 bcrypt = Bcrypt()
-jwt = JWTManager()
+jwt = None
 db = SQLAlchemy()
 facade = None
 
@@ -15,22 +15,77 @@ def create_app(config_class=config.DevelopmentConfig):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    os.makedirs(app.instance_path, exist_ok=True)
+
+    from .services.password_hasher import PasswordHasher, calibrated_rounds
+    if app.config.get("BCRYPT_TARGET_MS"):
+        app.config["BCRYPT_LOG_ROUNDS"] = calibrated_rounds(
+            app.config.get("BCRYPT_CALIBRATION_PATH") or os.path.join(app.instance_path, "bcrypt_calibration.json"),
+            app.config["BCRYPT_TARGET_MS"]
+        )
+
     CORS(app, resources={
         r"/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
             "allow_headers": ["Content-Type", "Authorization", "Accept"],
-            "expose_headers": ["Content-Type", "Authorization"],
+            "expose_headers": ["Content-Type", "Authorization", "X-Next-Cursor", "ETag"],
             "supports_credentials": True
         }
     })
 
+    from .services.token_cache import CachingJWTManager
     bcrypt.init_app(app)
-    jwt.init_app(app)
+    globals()["jwt"] = CachingJWTManager(app)
     db.init_app(app)
 
     from .services import HBnBFacade
-    globals()["facade"] = HBnBFacade()
+    from .services.shared_cache import SQLiteSharedCache
+    from .services.generation import GenerationCounter
+    shared_cache = SQLiteSharedCache(app.config["SHARED_CACHE_PATH"]) if app.config.get("SHARED_CACHE_PATH") else None
+    password_hasher = PasswordHasher(
+        workers=app.config.get("PASSWORD_HASH_WORKERS"),
+        max_pending=app.config.get("PASSWORD_HASH_MAX_PENDING", 64),
+        timeout=app.config.get("PASSWORD_HASH_TIMEOUT", 5.0),
+        rounds=app.config.get("BCRYPT_LOG_ROUNDS", 12)
+    )
+    revocation_signal = GenerationCounter(
+        app.config.get("REVOCATION_SIGNAL_PATH") or os.path.join(app.instance_path, "revocations.generation")
+    )
+    places_signal = GenerationCounter(
+        app.config.get("PLACES_SIGNAL_PATH") or os.path.join(app.instance_path, "places.generation")
+    )
+    globals()["facade"] = HBnBFacade(
+        app.config.get("ENTITY_CACHE"), shared_cache, password_hasher,
+        app.config.get("REVOCATION_FILTER", (100000, 5)), revocation_signal, places_signal
+    )
+
+    @jwt.token_in_blocklist_loader
+    def token_revoked(jwt_header, jwt_payload):
+        return facade.is_token_revoked(jwt_payload["jti"])
+
+    from .persistence.columns import add_missing_columns, backfill_timestamps
+    from .persistence.indexes import create_missing_indexes, drop_obsolete_indexes
+    from .persistence.geo import create_places_rtree, register_sql_functions
+    from .persistence.fulltext import create_places_fts
+    from .persistence.revoked_tokens import create_revoked_tokens_table
+    with app.app_context():
+        register_sql_functions()
+        added_columns = add_missing_columns()
+        backfill_timestamps()
+        create_missing_indexes()
+        drop_obsolete_indexes()
+        create_places_rtree()
+        create_places_fts()
+        create_revoked_tokens_table()
+        if {"review_count", "rating_average"} & set(added_columns.get("places", [])):
+            facade.repair_place_ratings()
+
+    @app.cli.command("repair-ratings")
+    def repair_ratings():
+        """Recompute the rating aggregates of the places from their reviews"""
+        facade.repair_place_ratings()
+        print("Rating aggregates of the places recomputed")
 
     api = Api(app, version='1.0', title='HBnB API', description='HBnB Application API')
 
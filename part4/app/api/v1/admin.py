@@ -1,7 +1,11 @@
 from flask_restx import Namespace, Resource, fields
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import jwt_required
 from flask import request
-from app import facade
+from app import facade, jwt
+from app.services.password_hasher import PasswordHasherUnavailable
+from .amenities import amenity_model
+from .authorization import current_principal
+from .bulk import bulk_payload, bulk_create, invalid_item
 
 api = Namespace('admin', description='Admin operations')
 
@@ -9,9 +13,7 @@ api = Namespace('admin', description='Admin operations')
 class AdminUserCreate(Resource):
     @jwt_required()
     def post(self):
-        current_user = get_jwt_identity()
-
-        if not current_user.get('is_admin', None):
+        if not current_principal().is_admin:
             return {'error': 'Admin privileges required'}, 403
 
         user_data = request.json
@@ -25,6 +27,8 @@ class AdminUserCreate(Resource):
             new_admin_user = facade.create_user(user_data)
         except ValueError as e:
             return {"error": "Invalid input data"}, 400
+        except PasswordHasherUnavailable:
+            return {"error": "Too many registrations, retry later"}, 503, {"Retry-After": "1"}
 
         return { "id": new_admin_user.id, "first_name": new_admin_user.first_name, "last_name": new_admin_user.last_name, "email": new_admin_user.email }, 201
 
@@ -32,9 +36,7 @@ class AdminUserCreate(Resource):
 class AdminUserResource(Resource):
     @jwt_required()
     def put(self, user_id):
-        current_user = get_jwt_identity()
-
-        if not current_user.get('is_admin'):
+        if not current_principal().is_admin:
             return {'error': 'Admin privileges required'}, 403
 
         data = request.json
@@ -50,7 +52,7 @@ class AdminUserResource(Resource):
             return {"error": "User not found"}, 404
 
         try:
-            facade.update_user(user_id, api.payload)
+            user = facade.update_user(user_id, api.payload)
         except Exception as e:
             return {"error": "Invalid input data"}, 400
 
@@ -60,8 +62,7 @@ class AdminUserResource(Resource):
 class AdminAmenityCreate(Resource):
     @jwt_required()
     def post(self):
-        current_user = get_jwt_identity()
-        if not current_user.get('is_admin'):
+        if not current_principal().is_admin:
             return {'error': 'Admin privileges required'}, 403
 
         amenity_data = api.payload
@@ -73,12 +74,30 @@ class AdminAmenityCreate(Resource):
 
         return { "id": new_amenity.id, "name": new_amenity.name }, 201
 
+@api.route('/amenities/bulk')
+class AdminAmenityBulk(Resource):
+    @jwt_required()
+    @api.expect([amenity_model])
+    def post(self):
+        if not current_principal().is_admin:
+            return {'error': 'Admin privileges required'}, 403
+
+        try:
+            amenities_data = bulk_payload()
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        def check(amenity_data):
+            if invalid_item(amenity_model, amenity_data):
+                return "Invalid input data"
+
+        return bulk_create(amenities_data, check, facade.create_amenities)
+
 @api.route('/amenities/<amenity_id>')
 class AdminAmenityModify(Resource):
     @jwt_required()
     def put(self, amenity_id):
-        current_user = get_jwt_identity()
-        if not current_user.get('is_admin'):
+        if not current_principal().is_admin:
             return {'error': 'Admin privileges required'}, 403
 
         obj = facade.get_amenity(amenity_id)
@@ -90,4 +109,18 @@ class AdminAmenityModify(Resource):
         except Exception as e:
             return {"error": "Invalid input data"}, 400
 
-        return {"message": "Amenity updated successfully"}, 200
\ No newline at end of file
+        return {"message": "Amenity updated successfully"}, 200
+
+@api.route('/stats')
+class AdminStats(Resource):
+    @jwt_required()
+    def get(self):
+        """Hit rates of the caches and state of the password hashing pool"""
+        if not current_principal().is_admin:
+            return {'error': 'Admin privileges required'}, 403
+
+        return {
+            "caches": facade.cache_stats(),
+            "verified_tokens": jwt.verified_tokens.stats(),
+            "password_hasher": facade.password_hasher.stats()
+        }, 200
@@ -1,5 +1,7 @@
 from flask_restx import Namespace, Resource, fields
 from app import facade
+from .pagination import pagination_parser, page_args, page_headers
+from .conditional import validators, conditional_response
 
 api = Namespace('amenities', description='Amenity operations')
 
@@ -24,10 +26,22 @@ class AmenityList(Resource):
 
         return { "id": new_amenity.id, "name": new_amenity.name }, 201
 
+    @api.expect(pagination_parser)
     @api.response(200, 'List of amenities retrieved successfully')
+    @api.response(400, 'Invalid pagination parameters')
     def get(self):
-        """Retrieve a list of all amenities"""
-        return [{ "id": i.id, "name": i.name } for i in facade.get_all_amenities()], 200
+        """Retrieve a page of amenities"""
+        try:
+            limit, cursor = page_args(pagination_parser.parse_args())
+            amenities, next_cursor = facade.get_amenities_page(limit, cursor, ("name",))
+        except ValueError:
+            return {"error": "Invalid pagination parameters"}, 400
+
+        return conditional_response(
+            validators(*amenities, extra=(next_cursor,)),
+            lambda: [{ "id": i.id, "name": i.name } for i in amenities],
+            page_headers(next_cursor)
+        )
 
 @api.route('/<amenity_id>')
 class AmenityResource(Resource):
@@ -38,7 +52,7 @@ class AmenityResource(Resource):
 
         if not obj:
             return {"error": "Amenity not found"}, 404
-        return { "id": obj.id, "name": obj.name }
+        return conditional_response(validators(obj), lambda: { "id": obj.id, "name": obj.name })
 
     @api.expect(amenity_model)
     @api.response(200, 'Amenity updated successfully')
@@ -1,6 +1,7 @@
 from flask_restx import Namespace, Resource, fields
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, get_jwt_identity, jwt_required
 from app import facade
+from app.services.password_hasher import PasswordHasherUnavailable
 
 api = Namespace('auth', description='Authentication operations')
 
@@ -20,16 +21,44 @@ class Login(Resource):
         # Step 1: Retrieve the user based on the provided email
         user = facade.get_user_by_email(credentials['email'])
 
-        # Step 2: Check if the user exists and the password is correct
-        if not user or not user.verify_password(credentials['password']):
-            return {'error': 'Invalid credentials'}, 401
+        # Step 2: Check if the user exists and the password is correct, out of the request thread
+        try:
+            if not user or not facade.verify_password(user, credentials['password']):
+                return {'error': 'Invalid credentials'}, 401
+        except PasswordHasherUnavailable:
+            return {'error': 'Too many login attempts, retry later'}, 503, {'Retry-After': '1'}
+
+        # Step 3: Upgrade (or downgrade) the stored hash to the configured bcrypt cost
+        facade.rehash_password(user, credentials['password'])
+
+        # Step 4: Create the JWT tokens with the user's id and is_admin flag
+        identity = {'id': str(user.id), 'is_admin': user.is_admin}
+        access_token = create_access_token(identity=identity)
+        refresh_token = create_refresh_token(identity=identity)
+
+        # Step 5: Return the JWT tokens to the client
+        return {'access_token': access_token, 'refresh_token': refresh_token}, 200
 
-        # Step 3: Create a JWT token with the user's id and is_admin flag
-        access_token = create_access_token(identity={'id': str(user.id), 'is_admin': user.is_admin})
+@api.route('/refresh')
+class Refresh(Resource):
+    @jwt_required(refresh=True)
+    def post(self):
+        """Return a new access token for a refresh token, without checking the password again"""
+        principal = facade.get_principal(get_jwt_identity()['id'], get_jwt()['iat'])
+        if not principal.exists:
+            return {'error': 'Invalid credentials'}, 401
 
-        # Step 4: Return the JWT token to the client
+        access_token = create_access_token(identity={'id': get_jwt_identity()['id'], 'is_admin': principal.is_admin})
         return {'access_token': access_token}, 200
 
+@api.route('/logout')
+class Logout(Resource):
+    @jwt_required(verify_type=False)
+    def post(self):
+        """Revoke the token of the request, access or refresh token"""
+        facade.revoke_token(get_jwt())
+        return {'message': 'Token revoked'}, 200
+
 @api.route('/protected')
 class ProtectedResource(Resource):
     @jwt_required()
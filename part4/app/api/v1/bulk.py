@@ -0,0 +1,62 @@
+import json
+from flask import current_app, request
+from jsonschema import Draft4Validator
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+def bulk_payload():
+    """
+    Items of a bulk request, sent either as a JSON array or as NDJSON (one object per line).
+    Raise ValueError when the body is malformed or holds too many items.
+    """
+    if request.mimetype == NDJSON_MIMETYPE:
+        try:
+            items = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        except json.JSONDecodeError:
+            raise ValueError("Invalid NDJSON body")
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array")
+
+    if len(items) > current_app.config["BULK_MAX_ITEMS"]:
+        raise ValueError("Too many items")
+    return items
+
+def invalid_item(model, item):
+    """
+    Whether the item fails the JSON schema of the api model, the one validate=True checks a
+    single payload against: a required field missing, or a field of the wrong type. Fields
+    the model does not declare, like id or created_at, are refused as well.
+    """
+    schema = dict(model.__schema__, additionalProperties=False)
+    return not isinstance(item, dict) or not Draft4Validator(schema).is_valid(item)
+
+def bulk_create(items, check, create):
+    """
+    Run a bulk creation: check(item) returns the error message of an item or None,
+    create(items) creates the accepted items at once and returns, for each one,
+    the created object or the exception which rejected it.
+    """
+    results = [check(item) for item in items]
+    accepted = [index for index, error in enumerate(results) if error is None]
+
+    for index, result in zip(accepted, create([items[i] for i in accepted])):
+        results[index] = "Invalid input data" if isinstance(result, Exception) else result
+    return bulk_response(results)
+
+def bulk_response(results):
+    """
+    Response of a bulk request from its per-item results, each being either
+    the created object or the error message of the item.
+    """
+    body = [
+        {"index": index, "status": 400, "error": result} if isinstance(result, str)
+        else {"index": index, "status": 201, "id": result.id}
+        for index, result in enumerate(results)
+    ]
+
+    created = sum(1 for item in body if item["status"] == 201)
+    if created == len(body):
+        return body, 201
+    return body, 207 if created else 400
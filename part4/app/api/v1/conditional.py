@@ -0,0 +1,37 @@
+from hashlib import sha1
+from flask import make_response, request
+from werkzeug.http import http_date, quote_etag
+
+def validators(*entities, extra=()):
+    """
+    (etag, last_modified) of a representation built from the entities, objects or rows holding
+    id and updated_at, and from the extra values it holds. The strong ETag hashes the request
+    path and query with the (id, updated_at) of every entity: for a list, the version of the
+    collection page.
+    """
+    entities = [entity for entity in entities if entity is not None]
+    digest = sha1(request.full_path.encode())
+    for entity in entities:
+        digest.update(f"|{entity.id}:{entity.updated_at}".encode())
+    for value in extra:
+        digest.update(f"|{value!r}".encode())
+
+    last_modified = max((entity.updated_at for entity in entities if entity.updated_at), default=None)
+    return digest.hexdigest(), last_modified
+
+def validator_headers(tags):
+    etag, last_modified = tags
+    headers = {"ETag": quote_etag(etag)}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def conditional_response(tags, build, headers=None):
+    """
+    304 Not Modified when the If-None-Match of the request holds the ETag, else the
+    body returned by build() with status 200. Both carry the validators and the headers.
+    """
+    headers = dict(headers or {}, **validator_headers(tags))
+    if request.if_none_match.contains_weak(tags[0]):
+        return make_response("", 304, headers)
+    return build(), 200, headers
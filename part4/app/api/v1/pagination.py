@@ -0,0 +1,37 @@
+from flask import current_app
+from flask_restx import reqparse
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+pagination_parser = reqparse.RequestParser()
+pagination_parser.add_argument('limit', type=int, location='args', help='Maximum number of items to return')
+pagination_parser.add_argument('cursor', type=str, location='args', help='Opaque cursor returned by the previous page')
+
+def page_args(args):
+    """Return the (limit, cursor) couple of a request, the limit being capped by the config"""
+    limit = args.get('limit')
+    if limit is None:
+        limit = current_app.config["PAGINATION_DEFAULT_LIMIT"]
+    if limit <= 0:
+        raise ValueError("Limit must be positive")
+    return min(limit, current_app.config["PAGINATION_MAX_LIMIT"]), args.get('cursor')
+
+def ids_arg(args):
+    """Ids of a ?ids=id1,id2 batch fetch in request order, or None when absent"""
+    if args.get('ids') is None:
+        return None
+    ids = [obj_id for obj_id in args['ids'].split(',') if obj_id]
+    if not ids or len(ids) > current_app.config["PAGINATION_MAX_LIMIT"]:
+        raise ValueError("Invalid ids")
+    return ids
+
+def batch_response(ids, objs, to_dict):
+    """Body of a batch fetch: the objects found in request order and the missing ids"""
+    return {
+        "items": [to_dict(obj) for obj in objs if obj is not None],
+        "missing": [obj_id for obj_id, obj in zip(ids, objs) if obj is None]
+    }
+
+def page_headers(next_cursor):
+    """Headers advertising the next page, if any"""
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
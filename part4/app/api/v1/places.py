@@ -3,9 +3,17 @@
 Places' API.
 """
 
-from flask_restx import fields, Namespace, Resource
+from flask import current_app, request
+from flask_restx import fields, Namespace, Resource, reqparse
 from flask_jwt_extended import get_jwt_identity, jwt_required
-from app import facade, db
+from app import facade
+from app.models.place import rating_average
+from app.persistence.geo import haversine_km
+from .authorization import current_principal
+from .pagination import pagination_parser, page_args, page_headers, ids_arg, batch_response
+from .reviews import review_expand_parser, review_to_dict, review_entities
+from .conditional import validators, conditional_response
+from .bulk import bulk_payload, bulk_create, invalid_item
 
 api = Namespace("places", description="Place operations")
 
@@ -18,6 +26,76 @@ place_model = api.model('Place', {
     'owner': fields.String(required=True, description='ID of the owner')
 })
 
+place_list_parser = pagination_parser.copy()
+place_list_parser.add_argument('min_price', type=float, location='args', help='Minimum price per night')
+place_list_parser.add_argument('max_price', type=float, location='args', help='Maximum price per night')
+place_list_parser.add_argument('sort', type=str, default='created_at', location='args',
+                               choices=('created_at', '-created_at', 'price', '-price', 'rating', 'distance'),
+                               help='Order of the places: oldest or newest first, cheapest or most expensive first, '
+                                    'best rated first, or nearest to (lat, lng) first')
+place_list_parser.add_argument('lat', type=float, location='args', help='Latitude of the point to sort by distance from')
+place_list_parser.add_argument('lng', type=float, location='args', help='Longitude of the point to sort by distance from')
+
+place_batch_parser = reqparse.RequestParser()
+place_batch_parser.add_argument('ids', type=str, required=True, location='args', help='Comma separated ids of the places to fetch')
+
+place_amenities_parser = pagination_parser.copy()
+place_amenities_parser.add_argument('amenities', type=str, required=True, location='args',
+                                    help='Comma separated ids of the amenities the places must have')
+place_amenities_parser.add_argument('amenities_match', type=str, default='all', choices=('all', 'any'), location='args',
+                                    help='Whether the places must have all the amenities or any of them')
+place_amenities_parser.add_argument('min_price', type=float, location='args', help='Minimum price per night')
+place_amenities_parser.add_argument('max_price', type=float, location='args', help='Maximum price per night')
+
+place_search_parser = pagination_parser.copy()
+place_search_parser.add_argument('q', type=str, location='args', help='Words to find in the title or description, matched as prefixes')
+place_search_parser.add_argument('lat', type=float, location='args', help='Latitude of the search center')
+place_search_parser.add_argument('lng', type=float, location='args', help='Longitude of the search center')
+place_search_parser.add_argument('radius_km', type=float, location='args', help='Search radius around the center, in kilometers')
+place_search_parser.add_argument('bbox', type=str, location='args', help='Search box: min_lng,min_lat,max_lng,max_lat')
+
+place_nearest_parser = reqparse.RequestParser()
+place_nearest_parser.add_argument('lat', type=float, required=True, location='args', help='Latitude of the point')
+place_nearest_parser.add_argument('lng', type=float, required=True, location='args', help='Longitude of the point')
+place_nearest_parser.add_argument('k', type=int, default=10, location='args', help='Number of places to return')
+
+# Column and direction of each sort of the places list, distance apart
+PLACE_SORTS = {
+    "created_at": ("created_at", False),
+    "-created_at": ("created_at", True),
+    "price": ("price", False),
+    "-price": ("price", True),
+    "rating": ("rating_average", True),
+}
+
+PLACE_LIST_COLUMNS = ("title", "price", "latitude", "longitude", "review_count", "rating_average")
+
+def parse_bbox(value):
+    """
+    (min_lat, min_lng, max_lat, max_lng) of a min_lng,min_lat,max_lng,max_lat bbox argument.
+    The corners must lie within GEO_MAX_RADIUS_KM of the center, the bound of the radius searches.
+    """
+    min_lng, min_lat, max_lng, max_lat = (float(i) for i in value.split(","))
+    if not (-90.0 <= min_lat <= max_lat <= 90.0 and -180.0 <= min_lng <= max_lng <= 180.0):
+        raise ValueError("Invalid bbox")
+
+    center_lat, center_lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+    corners = [(lat, lng) for lat in (min_lat, max_lat) for lng in (min_lng, max_lng)]
+    if max(haversine_km(center_lat, center_lng, lat, lng) for lat, lng in corners) > current_app.config["GEO_MAX_RADIUS_KM"]:
+        raise ValueError("Bbox too large")
+    return min_lat, min_lng, max_lat, max_lng
+
+def place_summary(place):
+    return {
+        "id": place.id,
+        "title": place.title,
+        "price": place.price,
+        "latitude": place.latitude,
+        "longitude": place.longitude,
+        "review_count": place.review_count,
+        "rating_average": rating_average(place.review_count, place.rating_average),
+    }
+
 
 @api.route("/")
 class PlaceList(Resource):
@@ -43,8 +121,7 @@ class PlaceList(Resource):
         if current_user["id"] != owner_id:
             return {"error": "Unauthorized action."}, 403
 
-        owner = facade.get_user(current_user["id"])
-        if not owner:
+        if not current_principal().exists:
             return {'error': "Owner not found"}, 404
 
         try:
@@ -62,15 +139,190 @@ class PlaceList(Resource):
             "owner": current_user["id"]
         }, 201
 
+    @api.expect(place_list_parser)
     @api.response(200, 'List of places retrieved successfully')
+    @api.response(400, 'Invalid pagination parameters')
+    def get(self):
+        """
+        Retrieve a sorted page of places, optionally filtered by price.
+        """
+        # Served by their own routes, each with its own response shape: refused rather than ignored
+        if "ids" in request.args or "amenities" in request.args:
+            return {"error": "Use /places/batch?ids= and /places/by_amenities?amenities="}, 400
+
+        args = place_list_parser.parse_args()
+        try:
+            limit, cursor = page_args(args)
+
+            if args["sort"] == "distance":
+                lat, lng = args["lat"], args["lng"]
+                if lat is None or lng is None or not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+                    raise ValueError("Invalid coordinates")
+                hits, next_cursor = facade.get_places_page_by_distance(
+                    lat, lng, limit, cursor, PLACE_LIST_COLUMNS,
+                    min_price=args["min_price"], max_price=args["max_price"]
+                )
+                return conditional_response(
+                    validators(*[place for place, _ in hits], extra=(next_cursor,)),
+                    lambda: [dict(place_summary(place), distance_km=round(distance, 3)) for place, distance in hits],
+                    page_headers(next_cursor)
+                )
+
+            sort, descending = PLACE_SORTS[args["sort"]]
+            places, next_cursor = facade.get_places_page(
+                limit, cursor, PLACE_LIST_COLUMNS,
+                min_price=args["min_price"], max_price=args["max_price"],
+                sort=sort, descending=descending
+            )
+        except ValueError:
+            return {"error": "Invalid pagination parameters"}, 400
+
+        return conditional_response(
+            validators(*places, extra=(next_cursor,)),
+            lambda: [place_summary(i) for i in places],
+            page_headers(next_cursor)
+        )
+
+@api.route("/batch")
+class PlaceBatch(Resource):
+    @api.expect(place_batch_parser)
+    @api.response(200, 'Places found, in the order of the ids, and the missing ids')
+    @api.response(400, 'Invalid ids')
+    def get(self):
+        """
+        Retrieve the places of the given ids
+        """
+        args = place_batch_parser.parse_args()
+        try:
+            ids = ids_arg(args)
+        except ValueError:
+            return {"error": "Invalid ids"}, 400
+
+        places = facade.get_places_by_ids(ids, PLACE_LIST_COLUMNS)
+        return conditional_response(validators(*places), lambda: batch_response(ids, places, place_summary))
+
+@api.route("/by_amenities")
+class PlaceAmenityFilter(Resource):
+    @api.expect(place_amenities_parser)
+    @api.response(200, 'Page of the matching places, their number and the facet counts per amenity')
+    @api.response(400, 'Invalid pagination parameters')
+    def get(self):
+        """
+        Retrieve a page of the places having all (or any) of the amenities, oldest first, optionally filtered by price
+        """
+        args = place_amenities_parser.parse_args()
+        try:
+            limit, cursor = page_args(args)
+            amenity_ids = ids_arg({"ids": args["amenities"]})
+            places, next_cursor, total, facets = facade.filter_places_by_amenities(
+                amenity_ids, args["amenities_match"] == "all", limit, cursor, PLACE_LIST_COLUMNS,
+                min_price=args["min_price"], max_price=args["max_price"]
+            )
+        except ValueError:
+            return {"error": "Invalid pagination parameters"}, 400
+
+        return conditional_response(
+            validators(*places, extra=(next_cursor, total, sorted(facets.items()))),
+            lambda: {"items": [place_summary(i) for i in places], "total": total, "facets": facets},
+            page_headers(next_cursor)
+        )
+
+@api.route("/search")
+class PlaceSearch(Resource):
+    @api.expect(place_search_parser)
+    @api.response(200, 'Places found, sorted by relevance for a text search, by distance otherwise')
+    @api.response(400, 'Invalid search parameters')
     def get(self):
-        """Retrieve a list of all places"""
-        return [{
-            "id": i.id,
-            "title": i.title,
-            "latitude": i.latitude,
-            "longitude": i.longitude,
-        } for i in facade.get_all_places()], 200
+        """
+        Search the places matching the words of q, within radius_km of (lat, lng), or inside a bbox
+        """
+        args = place_search_parser.parse_args()
+        try:
+            limit, cursor = page_args(args)
+
+            if args["q"] is not None:
+                hits, next_cursor = facade.search_places_text(args["q"], limit, cursor, PLACE_LIST_COLUMNS)
+                # bm25() ranks the best matches lowest: expose the opposite as a score.
+                # The ranks depend on the whole index, so they are part of the version.
+                return conditional_response(
+                    validators(*[place for place, _ in hits], extra=(next_cursor, [rank for _, rank in hits])),
+                    lambda: [dict(place_summary(place), score=round(-rank, 6)) for place, rank in hits],
+                    page_headers(next_cursor)
+                )
+
+            if args["bbox"] is not None:
+                hits, next_cursor = facade.search_places_in_bbox(parse_bbox(args["bbox"]), limit, cursor, PLACE_LIST_COLUMNS)
+            else:
+                lat, lng, radius_km = args["lat"], args["lng"], args["radius_km"]
+                if lat is None or lng is None or radius_km is None:
+                    raise ValueError("lat, lng and radius_km are required")
+                if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+                    raise ValueError("Invalid coordinates")
+                if not (0 < radius_km <= current_app.config["GEO_MAX_RADIUS_KM"]):
+                    raise ValueError("Invalid radius")
+                hits, next_cursor = facade.search_places_nearby(lat, lng, radius_km, limit, cursor, PLACE_LIST_COLUMNS)
+        except ValueError:
+            return {"error": "Invalid search parameters"}, 400
+
+        return conditional_response(
+            validators(*[place for place, _ in hits], extra=(next_cursor,)),
+            lambda: [dict(place_summary(place), distance_km=round(distance, 3)) for place, distance in hits],
+            page_headers(next_cursor)
+        )
+
+@api.route("/nearest")
+class PlaceNearest(Resource):
+    @api.expect(place_nearest_parser)
+    @api.response(200, 'Nearest places, sorted by distance')
+    @api.response(400, 'Invalid search parameters')
+    @api.response(501, 'Geo engine unavailable')
+    def get(self):
+        """
+        GET the k places nearest to (lat, lng)
+        """
+        if facade.geo_engine is None:
+            return {"error": "Geo engine unavailable"}, 501
+
+        args = place_nearest_parser.parse_args()
+        lat, lng, k = args["lat"], args["lng"], args["k"]
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0) or not (0 < k <= current_app.config["PAGINATION_MAX_LIMIT"]):
+            return {"error": "Invalid search parameters"}, 400
+
+        hits = facade.nearest_places(lat, lng, k, PLACE_LIST_COLUMNS)
+        return conditional_response(
+            validators(*[place for place, _ in hits]),
+            lambda: [dict(place_summary(place), distance_km=round(distance, 3)) for place, distance in hits]
+        )
+
+@api.route("/bulk")
+class PlaceBulk(Resource):
+    @jwt_required()
+    @api.expect([place_model])
+    @api.response(201, "Places successfully created")
+    @api.response(207, "Some places were rejected")
+    @api.response(400, "Invalid input data")
+    @api.response(404, "Owner not found")
+    def post(self):
+        """
+        POST several places at once, as a JSON array or NDJSON
+        """
+        current_user = get_jwt_identity()
+
+        try:
+            places_data = bulk_payload()
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        if not current_principal().exists:
+            return {'error': "Owner not found"}, 404
+
+        def check(place_data):
+            if invalid_item(place_model, place_data) or place_data.get("description") is None:
+                return "Invalid input data"
+            if place_data["owner"] != current_user["id"]:
+                return "Unauthorized action."
+
+        return bulk_create(places_data, check, facade.create_places)
 
 @api.route("/<place_id>")
 class PlaceResource(Resource):
@@ -79,36 +331,44 @@ class PlaceResource(Resource):
     Display data of place
     """
 
+    @api.expect(review_expand_parser)
     @api.response(200, "Place details retrieved successfully")
     @api.response(404, "Place not found")
     def get(self, place_id):
         """
-        GET place details from their ID
+        GET place details from their ID, with the reviews author name when expand=user
         """
-        place = facade.get_place(place_id)
-        if not place:
+        expand_user = review_expand_parser.parse_args()["expand"] == "user"
+
+        details = facade.get_place_details(place_id, expand_user)
+        if not details:
             return {"error": "Place not found"}, 404
 
-        owner = facade.get_user(place.owner_id)
+        place, reviews, amenities = details
+        owner = place.owner
         if not owner:
             return {'error': "Owner not found"}, 404
 
-        return {
+        entities = [place, owner, *review_entities(reviews, expand_user), *amenities]
+        return conditional_response(validators(*entities), lambda: {
             "id": place.id,
             "title": place.title,
             "description": place.description,
             "price": place.price,
             "latitude": place.latitude,
             "longitude": place.longitude,
+            "review_count": place.review_count,
+            "rating_average": place.rating_average,
+            "rating_histogram": place.rating_histogram,
             "owner": {
                 "id": owner.id,
                 "first_name": owner.first_name,
                 "last_name": owner.last_name,
                 "email": owner.email
             },
-            "reviews": [{"id": review.id, "text": review.text, "rating": review.rating, "user_id": review.user_id} for review in place.reviews],
-            "amenities": [{ "id": i.id, "name": i.name } for i in place.amenities]
-        }, 200
+            "reviews": [review_to_dict(review, expand_user) for review in reviews],
+            "amenities": [{ "id": i.id, "name": i.name } for i in amenities]
+        })
 
     @jwt_required()
     @api.expect(place_model)
@@ -126,7 +386,7 @@ class PlaceResource(Resource):
         if not obj:
             return {"error": "Place not found"}, 404
 
-        if not current_user["is_admin"]:
+        if not current_principal().is_admin:
             if current_user["id"] != obj.owner_id:
                 return {"error": "Unauthorized action."}, 403
 
@@ -147,17 +407,11 @@ class PlaceResource(Resource):
         if not obj:
             return {"error": "Place not found"}, 404
 
-        if not current_user["is_admin"]:
-            if current_user["id"] != obj.owner:
+        if not current_principal().is_admin:
+            if current_user["id"] != obj.owner_id:
                 return {"error": "Unauthorized action"}, 403
 
-        for review in obj.reviews:
-            facade.delete_review(review.id)
-
-        for amenity in obj.amenities:
-            facade.delete_amenity(amenity.id)
-
-        facade.delete_place(place_id)
+        facade.delete_place_cascade(place_id)
         return {"message": "Place deleted successfully"}, 200
 
 @api.route("/<place_id>/add_amenity/<amenity_id>")
@@ -172,15 +426,15 @@ class PlaceAmenity(Resource):
 
         place = facade.get_place(place_id)
         if not place:
-            return {"error": "Invalid place id"}
+            return {"error": "Invalid place id"}, 404
 
         # if current_user["id"] != place.owner_id:
         #     return { "error": "Unauthorized action." }, 403
 
         amenity = facade.get_amenity(amenity_id)
         if not amenity:
-            return {"error": "Invalid amenity id"}
+            return {"error": "Invalid amenity id"}, 404
 
-        place.amenities.append(amenity)
-        db.session.commit()
+        if not facade.add_amenity_to_place(place, amenity):
+            return {"error": "Place or amenity not found"}, 404
         return {"message": "Add amenity to place"}, 200
\ No newline at end of file
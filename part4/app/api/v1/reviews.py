@@ -1,6 +1,10 @@
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource, fields, reqparse
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import facade
+from .pagination import pagination_parser, page_args, page_headers
+from .conditional import validators, conditional_response
+from .bulk import bulk_payload, bulk_create, invalid_item
+from .authorization import current_principal
 
 api = Namespace('reviews', description='Review operations')
 
@@ -12,6 +16,20 @@ review_model = api.model('Review', {
     'place_id': fields.String(required=True, description='ID of the place')
 })
 
+review_expand_parser = reqparse.RequestParser()
+review_expand_parser.add_argument('expand', type=str, location='args', choices=('user',), help='Embed the author name in each review')
+
+def review_to_dict(review, expand_user=False):
+    data = {"id": review.id, "text": review.text, "rating": review.rating, "user_id": review.user_id}
+    if expand_user:
+        data["first_name"] = review.user.first_name
+        data["last_name"] = review.user.last_name
+    return data
+
+def review_entities(reviews, expand_user=False):
+    """Entities whose version the representation of the reviews depends on"""
+    return list(reviews) + ([review.user for review in reviews] if expand_user else [])
+
 @api.route('/')
 class ReviewList(Resource):
     @jwt_required()
@@ -33,17 +51,60 @@ class ReviewList(Resource):
             return {"error": "Unauthorized action"}, 403
 
         try:
-            new_review = facade.create_review(review_data)
+            with facade.transaction():
+                new_review = facade.create_review(review_data)
         except Exception as e:
             return {"error": "Invalid input data"}, 400
 
-        place.reviews.append(new_review)
         return {"id": new_review.id, "text": new_review.text, "rating": new_review.rating, "place_id": new_review.place_id, "user_id": new_review.user_id}, 201
 
+    @api.expect(pagination_parser)
     @api.response(200, 'List of reviews retrieved successfully')
+    @api.response(400, 'Invalid pagination parameters')
     def get(self):
-        """Retrieve a list of all reviews"""
-        return [{"id": i.id, "text": i.text, "rating": i.rating } for i in facade.get_all_reviews()], 200
+        """Retrieve a page of reviews"""
+        try:
+            limit, cursor = page_args(pagination_parser.parse_args())
+            reviews, next_cursor = facade.get_reviews_page(limit, cursor, ("text", "rating"))
+        except ValueError:
+            return {"error": "Invalid pagination parameters"}, 400
+
+        return conditional_response(
+            validators(*reviews, extra=(next_cursor,)),
+            lambda: [{"id": i.id, "text": i.text, "rating": i.rating } for i in reviews],
+            page_headers(next_cursor)
+        )
+
+@api.route('/bulk')
+class ReviewBulk(Resource):
+    @jwt_required()
+    @api.expect([review_model])
+    @api.response(201, 'Reviews successfully created')
+    @api.response(207, 'Some reviews were rejected')
+    @api.response(400, 'Invalid input data')
+    def post(self):
+        """Register several reviews at once, as a JSON array or NDJSON"""
+        current_user = get_jwt_identity()
+
+        try:
+            reviews_data = bulk_payload()
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        place_ids = facade.get_existing_place_ids(
+            review_data.get("place_id") for review_data in reviews_data
+            if isinstance(review_data, dict) and isinstance(review_data.get("place_id"), str)
+        )
+
+        def check(review_data):
+            if invalid_item(review_model, review_data):
+                return "Invalid input data"
+            if review_data["place_id"] not in place_ids:
+                return "Invalid place id"
+            if review_data["user_id"] != current_user["id"]:
+                return "Unauthorized action"
+
+        return bulk_create(reviews_data, check, facade.create_reviews)
 
 @api.route('/<review_id>')
 class ReviewResource(Resource):
@@ -54,7 +115,7 @@ class ReviewResource(Resource):
         obj = facade.get_review(review_id)
         if not obj:
             return {"error": "Review not found"}, 404
-        return { "id": obj.id, "text": obj.text, "rating": obj.rating }
+        return conditional_response(validators(obj), lambda: { "id": obj.id, "text": obj.text, "rating": obj.rating })
 
     @jwt_required()
     @api.expect(review_model)
@@ -69,7 +130,7 @@ class ReviewResource(Resource):
         if not obj:
             return {"error": "Review not found"}, 404
 
-        if not current_user["is_admin"]:
+        if not current_principal().is_admin:
             if current_user["id"] != obj.user_id:
                 return {"error": "Unauthorized action"}, 403
 
@@ -91,7 +152,7 @@ class ReviewResource(Resource):
         if not obj:
             return {"error": "Review not found"}, 404
 
-        if not current_user["is_admin"]:
+        if not current_principal().is_admin:
             if current_user["id"] != obj.user_id:
                 return {"error": "Unauthorized action"}, 403
 
@@ -100,11 +161,17 @@ class ReviewResource(Resource):
 
 @api.route('/places/<place_id>')
 class PlaceReviewList(Resource):
+    @api.expect(review_expand_parser)
     @api.response(200, 'List of reviews for the place retrieved successfully')
     @api.response(404, 'Place not found')
     def get(self, place_id):
-        """Get all reviews for a specific place"""
-        reviews = facade.get_reviews_by_place(place_id)
+        """Get all reviews for a specific place, with their author name when expand=user"""
+        expand_user = review_expand_parser.parse_args()["expand"] == "user"
+
+        reviews = facade.get_reviews_by_place(place_id, expand_user)
         if not reviews:
             return {"error": "Place not found"}, 404
-        return [{"id": review.id, "text": review.text, "rating": review.rating, "user_id": review.user_id} for review in facade.get_place(place_id).reviews], 200
+        return conditional_response(
+            validators(*review_entities(reviews, expand_user)),
+            lambda: [review_to_dict(review, expand_user) for review in reviews]
+        )
@@ -1,6 +1,9 @@
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from app import facade
+from app.services.password_hasher import PasswordHasherUnavailable
+from .pagination import pagination_parser, page_args, page_headers, ids_arg, batch_response
+from .conditional import validators, conditional_response
 
 api = Namespace('users', description='User operations')
 
@@ -11,6 +14,14 @@ user_model = api.model('User', {
     'password': fields.String(required=True, description='Password of the user'),
 })
 
+user_list_parser = pagination_parser.copy()
+user_list_parser.add_argument('ids', type=str, location='args', help='Comma separated ids of the users to fetch')
+
+USER_LIST_COLUMNS = ("first_name", "last_name", "email")
+
+def user_to_dict(user):
+    return { "id": user.id, "first_name": user.first_name, "last_name": user.last_name, "email": user.email }
+
 @api.route('/')
 class UserList(Resource):
     @api.expect(user_model, validate=True)
@@ -29,16 +40,33 @@ class UserList(Resource):
             new_user = facade.create_user(user_data)
         except ValueError as e:
             return {"error": "Invalid input data"}, 400
+        except PasswordHasherUnavailable:
+            return {"error": "Too many registrations, retry later"}, 503, {"Retry-After": "1"}
 
         return { "id": new_user.id, "first_name": new_user.first_name, "last_name": new_user.last_name, "email": new_user.email }, 201
 
+    @api.expect(user_list_parser)
     @api.response(200, 'List of users retrieved successfully')
+    @api.response(400, 'Invalid pagination parameters')
     def get(self):
-        """Retrieve a list of all users"""
-        return [
-            { "id": user.id, "first_name": user.first_name, "last_name": user.last_name, "email": user.email }
-            for user in facade.get_all_users()
-        ]
+        """Retrieve a page of users, or the users of the given ids"""
+        args = user_list_parser.parse_args()
+        try:
+            ids = ids_arg(args)
+            if ids is not None:
+                users = facade.get_users_by_ids(ids, USER_LIST_COLUMNS)
+                return conditional_response(validators(*users), lambda: batch_response(ids, users, user_to_dict))
+
+            limit, cursor = page_args(args)
+            users, next_cursor = facade.get_users_page(limit, cursor, USER_LIST_COLUMNS)
+        except ValueError:
+            return {"error": "Invalid pagination parameters"}, 400
+
+        return conditional_response(
+            validators(*users, extra=(next_cursor,)),
+            lambda: [user_to_dict(user) for user in users],
+            page_headers(next_cursor)
+        )
 
 @api.route('/<user_id>')
 class UserResource(Resource):
@@ -46,11 +74,10 @@ class UserResource(Resource):
     @api.response(404, 'User not found')
     def get(self, user_id):
         """Get user details by ID"""
-        try:
-            user = facade.get_user(user_id)
-            return { "id": user.id, "first_name": user.first_name, "last_name": user.last_name, "email": user.email }
-        except Exception as e:
+        user = facade.get_user(user_id)
+        if not user:
             return {'error': 'User not found'}, 404
+        return conditional_response(validators(user), lambda: user_to_dict(user))
 
     @jwt_required()
     @api.expect(user_model)
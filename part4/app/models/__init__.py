@@ -1,4 +1,5 @@
 from .user import User
 from .amenity import Amenity
 from .place import Place
-from .review import Review
\ No newline at end of file
+from .review import Review
+from .revoked_token import RevokedToken
\ No newline at end of file
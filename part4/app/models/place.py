@@ -4,18 +4,36 @@ from app import db
 place_amenities = db.Table(
     'place_amenities',
     db.Column('place_id', db.String(36), db.ForeignKey('places.id'), primary_key=True),
-    db.Column('amenity_id', db.String(36), db.ForeignKey('amenities.id'), primary_key=True)
+    db.Column('amenity_id', db.String(36), db.ForeignKey('amenities.id'), primary_key=True),
+    db.Index('ix_place_amenities_amenity_id', 'amenity_id')
 )
 
 class Place(BaseModel):
     __tablename__ = "places"
+    # Keyset pagination of the sorted lists: ORDER BY (key, id) read from the index
+    __table_args__ = (
+        db.Index('ix_places_created_at_id', 'created_at', 'id'),
+        db.Index('ix_places_price_id', 'price', 'id'),
+        db.Index('ix_places_rating_average_id', 'rating_average', 'id'),
+    )
 
     _title = db.Column("title", db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
     _price = db.Column("price", db.Float, nullable=False)
     _latitude = db.Column("latitude", db.Float, nullable=False)
     _longitude = db.Column("longitude", db.Float, nullable=False)
-    _owner_id = db.Column("owner", db.String(36), db.ForeignKey("users.id"), nullable=False)
+    _owner_id = db.Column("owner", db.String(36), db.ForeignKey("users.id"), nullable=False, index=True)
+
+    # Aggregates of the ratings of the reviews, maintained by HBnBFacade and recomputed by `flask repair-ratings`
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Stored to sort the places on it, 0 without reviews
+    _rating_average = db.Column("rating_average", db.Float, nullable=False, default=0, server_default="0")
+    rating_1_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_2_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_3_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_4_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    rating_5_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     owner = db.relationship("User", back_populates="places")
     reviews = db.relationship("Review", back_populates="place", lazy="dynamic")
@@ -64,3 +82,15 @@ class Place(BaseModel):
         if not (-180.0 <= value <= 180.0):
             raise ValueError("Longitude must be between -180 and 180")
         self._longitude = value
+
+    @property
+    def rating_average(self):
+        return rating_average(self.review_count, self._rating_average)
+
+    @property
+    def rating_histogram(self):
+        return {str(rating): getattr(self, f"rating_{rating}_count") for rating in range(1, 6)}
+
+def rating_average(review_count, average):
+    """Average rating of a place as exposed by the API, None without reviews"""
+    return round(average, 2) if review_count else None
\ No newline at end of file
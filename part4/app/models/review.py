@@ -3,11 +3,13 @@ from app import db
 
 class Review(BaseModel):
     __tablename__ = 'reviews'
+    # Also serves the lookups on place_id alone
+    __table_args__ = (db.Index('ix_reviews_place_id_created_at', 'place_id', 'created_at'),)
 
     text = db.Column(db.Text, nullable=False)
     _rating = db.Column('rating', db.Integer, nullable=False)
     place_id = db.Column(db.String(36), db.ForeignKey('places.id'), nullable=False)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
 
     place = db.relationship('Place', back_populates='reviews')
     user = db.relationship('User', back_populates='reviews')
@@ -0,0 +1,11 @@
+from .base import BaseModel
+from app import db
+
+class RevokedToken(BaseModel):
+    """JWT revoked before its expiry, kept until it expires"""
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(36), nullable=False, unique=True)
+    token_type = db.Column(db.String(10), nullable=False)
+    user_id = db.Column(db.String(36), nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
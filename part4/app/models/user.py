@@ -60,5 +60,14 @@ class User(BaseModel):
     def password(self, password):
         self._password = bcrypt.generate_password_hash(password).decode('utf-8')
 
+    @property
+    def password_hash(self):
+        return self._password
+
+    @password_hash.setter
+    def password_hash(self, value):
+        """Store a hash computed out of the model, by the PasswordHasher of the facade"""
+        self._password = value
+
     def verify_password(self, password):
         return bcrypt.check_password_hash(self._password, password)
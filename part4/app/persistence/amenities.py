@@ -1,7 +1,12 @@
 from app.models.amenity import Amenity
+from app.models.place import place_amenities
 from app.persistence.repository import SQLAlchemyRepository
 from app import db
 
 class AmenitiesRepository(SQLAlchemyRepository):
     def __init__(self):
-        super().__init__(Amenity)
\ No newline at end of file
+        super().__init__(Amenity)
+
+    def get_by_place(self, place_id):
+        return self.model.query.join(place_amenities) \
+            .filter(place_amenities.c.place_id == place_id).all()
\ No newline at end of file
@@ -0,0 +1,56 @@
+from datetime import datetime
+from sqlalchemy import func, inspect, or_, text, update
+from sqlalchemy.schema import CreateColumn
+from app import db
+
+def add_missing_columns():
+    """
+    Add the columns declared on the models that the tables of an existing database do not
+    have yet, with their server default. Tables that do not exist are left alone.
+    Return the names of the added columns by table name.
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    added = {}
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                    added.setdefault(table.name, []).append(column.name)
+    return added
+
+def backfill_timestamps():
+    """
+    Fill the created_at and updated_at left NULL by rows inserted without them (like the seeded
+    admins and amenities): the keyset pagination orders on (created_at, id) and cannot page past
+    a NULL key. Return the number of rows filled by table name.
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    now = datetime.now()
+    filled = {}
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables or not {"created_at", "updated_at"} <= set(table.columns.keys()):
+                continue
+
+            created_at, updated_at = table.c.created_at, table.c.updated_at
+            result = connection.execute(
+                update(table)
+                .where(or_(created_at.is_(None), updated_at.is_(None)))
+                .values(
+                    created_at=func.coalesce(created_at, updated_at, now),
+                    updated_at=func.coalesce(updated_at, created_at, now)
+                )
+            )
+            if result.rowcount:
+                filled[table.name] = result.rowcount
+    return filled
@@ -0,0 +1,59 @@
+import re
+from sqlalchemy import exc, inspect, text
+from app import db
+
+FTS_TABLE = "places_fts"
+
+# bm25 weights of the title and description columns
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# External-content FTS5 index over the title and description of the places,
+# kept in sync by triggers whatever path writes the table.
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+        USING fts5(title, description, content='places', content_rowid='rowid')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON places BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.rowid, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF title, description ON places BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.rowid, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.rowid, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON places BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description) VALUES ('delete', old.rowid, old.title, old.description);
+    END""",
+]
+
+def uses_fts():
+    return db.engine.dialect.name == "sqlite"
+
+def create_places_fts():
+    """
+    Create the full-text index of the places. It is rebuilt from the places table when
+    it does not match it anymore: just created, or rowids renumbered by a VACUUM.
+    """
+    if not uses_fts() or "places" not in inspect(db.engine).get_table_names():
+        return
+
+    with db.engine.begin() as connection:
+        for statement in FTS_DDL:
+            connection.execute(text(statement))
+
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('integrity-check', 1)"))
+    except exc.DatabaseError:
+        with db.engine.begin() as connection:
+            connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+def search_words(query):
+    """Words of a search query. Raise ValueError when it holds none"""
+    words = re.findall(r"\w+", query)
+    if not words:
+        raise ValueError("Empty search query")
+    return words
+
+def match_expression(words):
+    """FTS5 query matching the rows holding every word, each one as a prefix"""
+    return " ".join(f'"{word}"*' for word in words)
@@ -0,0 +1,87 @@
+import sqlite3
+from math import asin, cos, degrees, pi, radians, sin, sqrt
+from sqlalchemy import event, inspect, text
+from app import db
+
+EARTH_RADIUS_KM = 6371.0088
+# Largest distance between two points of the sphere
+HALF_CIRCUMFERENCE_KM = pi * EARTH_RADIUS_KM
+
+RTREE_TABLE = "places_rtree"
+
+# R*Tree over the coordinates of the places, keyed by the rowid of places and kept
+# in sync by triggers, whatever path (ORM, bulk insert, bulk delete) writes the table.
+RTREE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE}
+        USING rtree(id, min_lat, max_lat, min_lng, max_lng, +place_id)""",
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_insert AFTER INSERT ON places BEGIN
+        INSERT INTO {RTREE_TABLE} VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude, new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_update AFTER UPDATE OF latitude, longitude ON places BEGIN
+        UPDATE {RTREE_TABLE} SET min_lat = new.latitude, max_lat = new.latitude,
+            min_lng = new.longitude, max_lng = new.longitude
+        WHERE id = new.rowid;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_delete AFTER DELETE ON places BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.rowid;
+    END""",
+]
+
+# A VACUUM may renumber the rowids of places: drop the entries which no longer
+# match their place and index the places without an entry.
+RTREE_SYNC = [
+    f"""DELETE FROM {RTREE_TABLE} WHERE NOT EXISTS (
+        SELECT 1 FROM places WHERE places.rowid = {RTREE_TABLE}.id AND places.id = {RTREE_TABLE}.place_id
+    )""",
+    f"""INSERT INTO {RTREE_TABLE}
+        SELECT rowid, latitude, latitude, longitude, longitude, id FROM places
+        WHERE rowid NOT IN (SELECT id FROM {RTREE_TABLE})""",
+]
+
+def uses_rtree():
+    return db.engine.dialect.name == "sqlite"
+
+def create_places_rtree():
+    """Create the spatial index of the places and bring it up to date with the places table"""
+    if not uses_rtree() or "places" not in inspect(db.engine).get_table_names():
+        return
+
+    with db.engine.begin() as connection:
+        for statement in RTREE_DDL + RTREE_SYNC:
+            connection.execute(text(statement))
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points, in kilometers"""
+    lat1, lng1, lat2, lng2 = map(radians, (lat1, lng1, lat2, lng2))
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+def register_sql_functions():
+    """Make haversine_km() callable from the SQL of the SQLite connections of the app engine"""
+    if not uses_rtree() or event.contains(db.engine, "connect", _create_functions):
+        return
+    event.listen(db.engine, "connect", _create_functions)
+    # Connections opened before do not have the functions
+    db.engine.dispose()
+
+def _create_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function("haversine_km", 4, haversine_km, deterministic=True)
+
+def bbox_around(lat, lng, radius_km):
+    """
+    Bounding box (min_lat, min_lng, max_lat, max_lng) holding the circle of radius_km around the point,
+    with the same sphere as haversine_km so that every place within radius_km falls inside it.
+    The box spans every longitude when the circle reaches a pole or crosses the antimeridian.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    min_lat, max_lat = lat - degrees(angle), lat + degrees(angle)
+
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return max(-90.0, min_lat), -180.0, min(90.0, max_lat), 180.0
+
+    # Widest longitude extent of the circle, reached north of the center in the south and conversely
+    delta_lng = degrees(asin(sin(angle) / cos(radians(lat))))
+    if lng - delta_lng < -180.0 or lng + delta_lng > 180.0:
+        return min_lat, -180.0, max_lat, 180.0
+    return min_lat, lng - delta_lng, max_lat, lng + delta_lng
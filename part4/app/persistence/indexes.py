@@ -0,0 +1,40 @@
+from sqlalchemy import inspect, text
+from app import db
+
+# Indexes created by earlier versions of the models, superseded by newer ones
+OBSOLETE_INDEXES = {
+    "places": ["ix_places_price"],  # Covered by ix_places_price_id
+}
+
+def create_missing_indexes():
+    """
+    Create the indexes declared on the models that an existing database does not have yet.
+    Tables that do not exist are left alone.
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+
+
+def drop_obsolete_indexes():
+    """Drop the indexes of OBSOLETE_INDEXES that an existing database still has"""
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+
+    with db.engine.begin() as connection:
+        for table_name, names in OBSOLETE_INDEXES.items():
+            if table_name not in tables:
+                continue
+
+            existing = {index["name"] for index in inspector.get_indexes(table_name)}
+            for name in names:
+                if name in existing:
+                    connection.execute(text(f"DROP INDEX {name}"))
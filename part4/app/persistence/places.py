@@ -1,7 +1,195 @@
-from app.models.place import Place
-from app.persistence.repository import SQLAlchemyRepository
+from app.models.place import Place, place_amenities
+from app.models.review import Review
+from app.persistence.repository import SQLAlchemyRepository, commit, decode_cursor, encode_cursor
+from app.persistence.geo import HALF_CIRCUMFERENCE_KM, RTREE_TABLE, bbox_around, uses_rtree
+from app.persistence.fulltext import DESCRIPTION_WEIGHT, FTS_TABLE, TITLE_WEIGHT, match_expression, search_words, uses_fts
+from sqlalchemy import Float, and_, case, cast, column, delete, func, literal, literal_column, or_, table, tuple_, update
+from sqlalchemy.orm import joinedload
 from app import db
 
+RATING_COUNTS = [f"rating_{rating}_count" for rating in range(1, 6)]
+
+# First ring searched past the cursor by the pages of places sorted by distance
+DISTANCE_SEARCH_STEP_KM = 10.0
+
+def distance_page(rows, limit):
+    """Page of (row, distance_km) and cursor of the next one, from the limit + 1 rows of distance_rows()"""
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].distance_km, page[-1].id) if len(rows) > limit else None
+    return [(row, row.distance_km) for row in page], next_cursor
+
 class PlacesRepository(SQLAlchemyRepository):
     def __init__(self):
-        super().__init__(Place)
\ No newline at end of file
+        super().__init__(Place)
+
+    def get_page(self, limit, cursor=None, columns=None, min_price=None, max_price=None, sort="created_at", descending=False):
+        return super().get_page(limit, cursor, columns, self.price_criteria(min_price, max_price), sort, descending)
+
+    def get_page_by_distance(self, lat, lng, limit, cursor=None, columns=(), min_price=None, max_price=None):
+        """
+        Places sorted by distance to the point, with keyset pagination on (distance, id).
+        Rather than computing the distance of every place, the page is searched within a circle
+        around the point read through the R*Tree, starting DISTANCE_SEARCH_STEP_KM past the
+        cursor and doubling that step until it holds the page or the whole globe: the cost of a
+        page grows with the number of places closer to the point than its last one.
+        Return a page of (row, distance_km) and the cursor of the next page.
+        """
+        after = decode_cursor(cursor, float, str) if cursor else None
+        start = after[0] if after else 0.0
+        criteria = self.price_criteria(min_price, max_price)
+
+        step = DISTANCE_SEARCH_STEP_KM
+        while start + step < HALF_CIRCUMFERENCE_KM:
+            radius_km = start + step
+            rows = self.distance_rows(
+                lat, lng, limit, after, columns, criteria, box=bbox_around(lat, lng, radius_km), radius_km=radius_km
+            )
+            if len(rows) > limit:
+                return distance_page(rows, limit)
+            step *= 2
+        return distance_page(self.distance_rows(lat, lng, limit, after, columns, criteria), limit)
+
+    def price_criteria(self, min_price=None, max_price=None):
+        criteria = []
+        if min_price is not None:
+            criteria.append(Place._price >= min_price)
+        if max_price is not None:
+            criteria.append(Place._price <= max_price)
+        return criteria
+
+    def get_amenity_links(self):
+        """(place_id, created_at, amenity_id) of every amenity link, in the order of the places list"""
+        return db.session.query(place_amenities.c.place_id, Place.created_at, place_amenities.c.amenity_id) \
+            .join(Place, Place.id == place_amenities.c.place_id) \
+            .order_by(Place.created_at, Place.id).yield_per(10000)
+
+    def get_with_owner(self, place_id):
+        return self.model.query.options(joinedload(Place.owner)).filter(Place.id == place_id).first()
+
+    def delete_cascade(self, place_id):
+        """
+        Delete the place, its reviews and its amenity links with one statement each,
+        in a single transaction. The amenities themselves are kept.
+        """
+        db.session.execute(delete(Review).where(Review.place_id == place_id))
+        db.session.execute(place_amenities.delete().where(place_amenities.c.place_id == place_id))
+        db.session.execute(delete(Place).where(Place.id == place_id))
+        commit()
+
+    def within_box(self, query, min_lat, min_lng, max_lat, max_lng):
+        """Restrict the query to the places inside the box, found through the R*Tree when available"""
+        query = query.filter(Place._latitude.between(min_lat, max_lat), Place._longitude.between(min_lng, max_lng))
+
+        if uses_rtree():
+            rtree = table(RTREE_TABLE, *[column(name) for name in ("id", "min_lat", "max_lat", "min_lng", "max_lng")])
+            query = query.join(rtree, rtree.c.id == literal_column("places.rowid")).filter(
+                rtree.c.min_lat <= max_lat, rtree.c.max_lat >= min_lat,
+                rtree.c.min_lng <= max_lng, rtree.c.max_lng >= min_lng
+            )
+        return query
+
+    def get_coordinates(self):
+        """(id, latitude, longitude) of every place, streamed by batches"""
+        return db.session.query(Place.id, Place._latitude, Place._longitude).yield_per(10000)
+
+    def search_nearby(self, lat, lng, radius_km, limit, cursor=None, columns=()):
+        """
+        Places within radius_km of the point, sorted by distance.
+        Return a page of (row, distance_km) and the cursor of the next page.
+        """
+        after = decode_cursor(cursor, float, str) if cursor else None
+        rows = self.distance_rows(lat, lng, limit, after, columns, box=bbox_around(lat, lng, radius_km), radius_km=radius_km)
+        return distance_page(rows, limit)
+
+    def search_in_bbox(self, min_lat, min_lng, max_lat, max_lng, limit, cursor=None, columns=()):
+        """Places inside the box, sorted by distance to its center, paginated as search_nearby"""
+        after = decode_cursor(cursor, float, str) if cursor else None
+        center = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+        rows = self.distance_rows(*center, limit, after, columns, box=(min_lat, min_lng, max_lat, max_lng))
+        return distance_page(rows, limit)
+
+    def distance_rows(self, lat, lng, limit, after=None, columns=(), criteria=(), box=None, radius_km=None):
+        """
+        Up to limit + 1 rows of the places after the (distance, id) key, ordered by distance to
+        the point: the database computes haversine_km() over the candidates read from the R*Tree
+        for the box (every place without box), keeps those within radius_km and applies the keyset.
+        """
+        distance = func.haversine_km(lat, lng, Place._latitude, Place._longitude)
+        query = self.project(*columns).add_columns(distance.label("distance_km")).filter(*criteria)
+        if box is not None:
+            query = self.within_box(query, *box)
+        if radius_km is not None:
+            query = query.filter(distance <= radius_km)
+        if after is not None:
+            query = query.filter(tuple_(distance, Place.id) > tuple_(*after))
+        return query.order_by(distance, Place.id).limit(limit + 1).all()
+
+    def search_text(self, query, limit, cursor=None, columns=()):
+        """
+        Places holding every word of the query, as a prefix, in their title or description,
+        best BM25 rank first (title words weigh more).
+        Return a page of (row, rank) and the cursor of the next page.
+        """
+        words = search_words(query)
+
+        if uses_fts():
+            fts = table(FTS_TABLE, column("rowid"))
+            rank = func.bm25(literal_column(FTS_TABLE), TITLE_WEIGHT, DESCRIPTION_WEIGHT)
+            rows = self.project(*columns).join(fts, fts.c.rowid == literal_column("places.rowid")) \
+                .filter(literal_column(FTS_TABLE).op("MATCH")(match_expression(words)))
+        else:
+            rank = literal(0.0)
+            rows = self.project(*columns).filter(*[
+                or_(Place._title.ilike(f"%{word}%"), Place.description.ilike(f"%{word}%")) for word in words
+            ])
+
+        rows = rows.add_columns(rank.label("rank"))
+        if cursor:
+            after_rank, after_id = decode_cursor(cursor, float, str)
+            rows = rows.filter(or_(rank > after_rank, and_(rank == after_rank, Place.id > after_id)))
+
+        rows = rows.order_by(rank, Place.id).limit(limit + 1).all()
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1].rank, page[-1].id) if len(rows) > limit else None
+        return [(row, row.rank) for row in page], next_cursor
+
+    def update_ratings(self, place_id, added=(), removed=()):
+        """Apply to the rating aggregates of the place the ratings of added and removed reviews, in one atomic UPDATE"""
+        added, removed = list(added), list(removed)
+        review_count = Place.review_count + len(added) - len(removed)
+        rating_sum = Place.rating_sum + sum(added) - sum(removed)
+        values = {
+            Place.review_count: review_count,
+            Place.rating_sum: rating_sum,
+            Place._rating_average: func.coalesce(cast(rating_sum, Float) / func.nullif(review_count, 0), 0)
+        }
+        for rating, name in enumerate(RATING_COUNTS, start=1):
+            delta = added.count(rating) - removed.count(rating)
+            if delta:
+                values[getattr(Place, name)] = getattr(Place, name) + delta
+        db.session.execute(update(Place).where(Place.id == place_id).values(values))
+        commit()
+
+    def repair_ratings(self):
+        """Recompute the rating aggregates of every place from the reviews, with one GROUP BY query"""
+        ratings = db.session.query(
+            Review.place_id.label("place_id"),
+            func.count().label("review_count"),
+            func.sum(Review._rating).label("rating_sum"),
+            func.avg(Review._rating).label("rating_average"),
+            *[func.sum(case((Review._rating == rating, 1), else_=0)).label(name)
+              for rating, name in enumerate(RATING_COUNTS, start=1)]
+        ).group_by(Review.place_id).subquery()
+
+        names = ["review_count", "rating_sum", "rating_average"] + RATING_COUNTS
+        db.session.execute(update(Place).values({self.attribute(name): 0 for name in names}))
+        db.session.execute(
+            update(Place).where(Place.id == ratings.c.place_id)
+            .values({self.attribute(name): ratings.c[name] for name in names})
+            .execution_options(synchronize_session=False)
+        )
+        commit()
+
+    def add_amenity(self, place, amenity):
+        place.amenities.append(amenity)
+        commit()
\ No newline at end of file
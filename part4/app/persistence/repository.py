@@ -1,6 +1,27 @@
 from abc import ABC, abstractmethod
+import uuid
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from sqlalchemy import insert, tuple_
+from sqlalchemy.exc import IntegrityError
 from app import db
 
+def encode_cursor(*keys):
+    """Build the opaque cursor pointing right after the sort keys, e.g. (created_at, id)"""
+    raw = "|".join(str(key) for key in keys).encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor, *types):
+    """Inverse of encode_cursor, converting each key with its type. Raise ValueError on a malformed cursor"""
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        keys = raw.split("|", len(types) - 1)
+        if len(keys) != len(types):
+            raise ValueError
+        return tuple(key_type(key) for key_type, key in zip(types, keys))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
 class Repository(ABC):
     @abstractmethod
     def add(self, obj):
@@ -26,33 +47,150 @@ class Repository(ABC):
     def get_by_attribute(self, attr_name, attr_value):
         pass
 
+UNIT_OF_WORK_KEY = "unit_of_work_depth"
+
+# Stay below the number of bound parameters allowed by SQLite in a statement
+IN_CHUNK_SIZE = 900
+
+def chunks(values, size=IN_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def commit():
+    """
+    Commit the session, unless a unit of work is open on it (see HBnBFacade.transaction):
+    the changes are then only flushed and committed when the unit of work ends.
+    """
+    if db.session.info.get(UNIT_OF_WORK_KEY, 0):
+        db.session.flush()
+    else:
+        db.session.commit()
+
 class SQLAlchemyRepository(Repository):
     def __init__(self, model):
         self.model = model
 
     def add(self, obj):
         db.session.add(obj)
-        db.session.commit()
+        commit()
+
+    def add_many(self, objs):
+        """
+        Insert the objects with a single executemany instead of a flush per object.
+        The objects are only read to build the rows, they are not added to the session.
+        When the statement breaks a constraint, the rows are inserted one by one to
+        keep the others. Return, for each object, None or the IntegrityError which
+        rejected it.
+        """
+        if not objs:
+            return []
+        columns = [prop.key for prop in self.model.__mapper__.column_attrs]
+        rows = []
+        for obj in objs:
+            if obj.id is None:
+                obj.id = str(uuid.uuid4())
+            rows.append({key: getattr(obj, key) for key in columns if getattr(obj, key) is not None})
+
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(self.model), rows)
+            errors = [None] * len(rows)
+        except IntegrityError:
+            errors = []
+            for row in rows:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(self.model), [row])
+                    errors.append(None)
+                except IntegrityError as e:
+                    errors.append(e)
+        commit()
+        return errors
 
     def get(self, obj_id):
         return self.model.query.get(obj_id)
 
+    def get_many(self, ids, columns=None, criteria=()):
+        """
+        Objects (or rows of the given columns) of the ids, fetched with one IN query per chunk
+        of ids. Return a list in the order of ids, holding None for the missing ones and for
+        those not matching the SQL criteria.
+        """
+        query = (self.project(*columns) if columns else self.model.query).filter(*criteria)
+        found = {}
+        for chunk in chunks(set(ids)):
+            found.update((obj.id, obj) for obj in query.filter(self.model.id.in_(chunk)))
+        return [found.get(obj_id) for obj_id in ids]
+
+    def existing_ids(self, ids):
+        """Subset of the given ids present in the table"""
+        found = set()
+        for chunk in chunks(set(ids)):
+            found.update(row.id for row in db.session.query(self.model.id).filter(self.model.id.in_(chunk)))
+        return found
+
     def get_all(self):
         return self.model.query.all()
 
+    def get_page(self, limit, cursor=None, columns=None, criteria=(), sort="created_at", descending=False):
+        """
+        Return a page of model instances matching the SQL criteria, or of lightweight
+        rows holding only id, created_at, the sort column and the given columns when
+        columns is set.
+        """
+        query = self.project(*columns, sort) if columns else self.model.query
+        return self.paginate(query.filter(*criteria), limit, cursor, sort, descending)
+
+    def attribute(self, name):
+        """Mapped attribute of the model by public name, "title" resolving to the "_title" attribute"""
+        key = name if name in self.model.__mapper__.column_attrs else f"_{name}"
+        return getattr(self.model, key)
+
+    def column(self, name):
+        """Column of the model by public name, labeled with it"""
+        return self.attribute(name).label(name)
+
+    def project(self, *columns):
+        """Query selecting only the given columns (plus id, created_at and updated_at) without building ORM objects"""
+        names = dict.fromkeys(("id", "created_at", "updated_at") + tuple(columns))
+        return db.session.query(*[self.column(name) for name in names])
+
+    def paginate(self, query, limit, cursor=None, sort="created_at", descending=False):
+        """
+        Keyset pagination ordered by (sort column, id), both descending when asked.
+        Projected rows must hold the sort column under its public name.
+        Return the rows of the page and the cursor of the next one (None on the last page).
+        """
+        key = self.attribute(sort)
+        if cursor:
+            key_type = key.type.python_type
+            value, obj_id = decode_cursor(cursor, datetime.fromisoformat if key_type is datetime else key_type, str)
+            position = tuple_(key, self.model.id)
+            query = query.filter(position < tuple_(value, obj_id) if descending else position > tuple_(value, obj_id))
+
+        order = (key.desc(), self.model.id.desc()) if descending else (key, self.model.id)
+        rows = query.order_by(*order).limit(limit + 1).all()
+        if len(rows) <= limit:
+            return rows, None
+
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor(getattr(last, key.key if isinstance(last, self.model) else sort), last.id)
+
     def update(self, obj_id, data):
         obj = self.get(obj_id)
         if obj:
             for key, value in data.items():
                 setattr(obj, key, value)
-            db.session.commit()
+            commit()
         return obj
 
     def delete(self, obj_id):
         obj = self.get(obj_id)
         if obj:
             db.session.delete(obj)
-            db.session.commit()
+            commit()
 
     def get_by_attribute(self, attr_name, attr_value):
         return self.model.query.filter_by(**{attr_name: attr_value}).first()
@@ -1,7 +1,14 @@
 from app.models.review import Review
 from app.persistence.repository import SQLAlchemyRepository
+from sqlalchemy.orm import joinedload
 from app import db
 
 class ReviewsRepository(SQLAlchemyRepository):
     def __init__(self):
-        super().__init__(Review)
\ No newline at end of file
+        super().__init__(Review)
+
+    def get_by_place(self, place_id, with_user=False):
+        """Reviews of a place, joined with their author when with_user is set, in a single query"""
+        query = self.model.query.options(joinedload(Review.user)) if with_user else self.model.query
+        return query.filter(Review.place_id == place_id) \
+            .order_by(Review.created_at, Review.id).all()
\ No newline at end of file
@@ -0,0 +1,25 @@
+from datetime import datetime
+from app.models.revoked_token import RevokedToken
+from app.persistence.repository import SQLAlchemyRepository, commit
+from app import db
+
+def create_revoked_tokens_table():
+    """Create the table of the revoked tokens in a database created before it existed"""
+    RevokedToken.__table__.create(db.engine, checkfirst=True)
+
+class RevokedTokensRepository(SQLAlchemyRepository):
+    def __init__(self):
+        super().__init__(RevokedToken)
+
+    def is_revoked(self, jti):
+        return db.session.query(self.model.query.filter_by(jti=jti).exists()).scalar()
+
+    def get_active_jtis(self):
+        """jti of the revoked tokens not expired yet"""
+        rows = db.session.query(self.model.jti).filter(self.model.expires_at > datetime.now())
+        return [row.jti for row in rows]
+
+    def purge_expired(self):
+        """Delete the revoked tokens which expired: they are rejected anyway"""
+        self.model.query.filter(self.model.expires_at <= datetime.now()).delete(synchronize_session=False)
+        commit()
@@ -0,0 +1,121 @@
+"""
+In-process bitmap index of the amenities of the places.
+
+Each place linked to an amenity gets an ordinal, following the (created_at, id)
+order of the places list, and each amenity a bitset of the ordinals of its
+places. The bitsets are Python integers: AND/OR of several amenities and their
+population counts run word by word in C, and since ordinals are dense a bitset
+costs one bit per place. The ordinals of the removed places are left unused
+until there are too many of them: the index is then rebuilt at the next query,
+which numbers the remaining places afresh.
+"""
+
+import threading
+from bisect import bisect_right
+
+class AmenityIndex:
+    # Share of unused ordinals, once there are at least COMPACT_MIN_REMOVED of them,
+    # past which the index is rebuilt
+    COMPACT_RATIO = 0.25
+    COMPACT_MIN_REMOVED = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._keys = []
+        self._ordinals = {}
+        self._bitmaps = {}
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def invalidate(self):
+        """Mark the index to be loaded again at its next use"""
+        with self._lock:
+            self._loaded = False
+
+    def load(self, rows):
+        """(Re)build the index from (place_id, created_at, amenity_id) rows sorted by (created_at, place_id)"""
+        with self._lock:
+            self._keys = []
+            self._ordinals = {}
+            self._bitmaps = {}
+            for place_id, created_at, amenity_id in rows:
+                self._link(place_id, created_at, amenity_id)
+            self._loaded = True
+
+    def link(self, place_id, created_at, amenity_id):
+        """
+        Record that the place has the amenity. Ignored until the index is loaded. A place
+        older than the last indexed one cannot get an ordinal in order: the index is then
+        marked to be reloaded.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            if place_id not in self._ordinals and self._keys and (created_at, place_id) < self._keys[-1]:
+                self._loaded = False
+                return
+            self._link(place_id, created_at, amenity_id)
+
+    def remove_place(self, place_id):
+        """
+        Forget a place. Its ordinal stays unused, or the index is marked to be reloaded
+        when too many of them are. The cursors hold (created_at, id) keys, not ordinals:
+        they stay valid across the reload.
+        """
+        with self._lock:
+            ordinal = self._ordinals.pop(place_id, None)
+            if ordinal is None:
+                return
+            mask = ~(1 << ordinal)
+            for amenity_id in self._bitmaps:
+                self._bitmaps[amenity_id] &= mask
+
+            removed = len(self._keys) - len(self._ordinals)
+            if removed >= self.COMPACT_MIN_REMOVED and removed > self.COMPACT_RATIO * len(self._keys):
+                self._loaded = False
+
+    def remove_amenity(self, amenity_id):
+        with self._lock:
+            self._bitmaps.pop(amenity_id, None)
+
+    def match(self, amenity_ids, match_all=True):
+        """Bitset of the places having all (or any) of the amenities"""
+        with self._lock:
+            bitmaps = [self._bitmaps.get(amenity_id, 0) for amenity_id in amenity_ids]
+        matched = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            matched = matched & bitmap if match_all else matched | bitmap
+        return matched
+
+    def facets(self, matched):
+        """Number of matched places having each amenity, for the amenities held by at least one"""
+        with self._lock:
+            counts = {amenity_id: (bitmap & matched).bit_count() for amenity_id, bitmap in self._bitmaps.items()}
+        return {amenity_id: count for amenity_id, count in counts.items() if count}
+
+    def place_keys(self, matched, after=None, count=None):
+        """
+        (created_at, id) keys of the matched places in order, starting after
+        the given key, at most count of them.
+        """
+        with self._lock:
+            ordinal = bisect_right(self._keys, after) if after is not None else 0
+            matched >>= ordinal
+            keys = []
+            while matched and (count is None or len(keys) < count):
+                skip = (matched & -matched).bit_length() - 1
+                ordinal += skip
+                keys.append(self._keys[ordinal])
+                matched >>= skip + 1
+                ordinal += 1
+            return keys
+
+    def _link(self, place_id, created_at, amenity_id):
+        ordinal = self._ordinals.get(place_id)
+        if ordinal is None:
+            ordinal = self._ordinals[place_id] = len(self._keys)
+            self._keys.append((created_at, place_id))
+        self._bitmaps[amenity_id] = self._bitmaps.get(amenity_id, 0) | (1 << ordinal)
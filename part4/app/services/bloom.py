@@ -0,0 +1,32 @@
+"""
+Bloom filter: a set answering "maybe present" or "surely absent".
+
+Each key sets a few bits of a bit array, at positions derived from one BLAKE2b digest
+(double hashing). A key whose bits are not all set was never added. A key whose bits
+are all set may have been added, wrong about error_rate of the time when the filter
+holds capacity keys.
+"""
+
+import math
+from hashlib import blake2b
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
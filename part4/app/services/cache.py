@@ -0,0 +1,107 @@
+"""
+Process-local read-through cache of the entities read by HBnBFacade.
+
+The cache holds read-only snapshots of the column values, not ORM instances:
+a snapshot does not belong to any session, so it can be served to every
+request without touching SQLAlchemy.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+class Snapshot:
+    """Read-only copy of the public column values of an entity"""
+    __slots__ = ("_values",)
+
+    def __init__(self, obj):
+        values = {}
+        for key in obj.__mapper__.column_attrs.keys():
+            name = key.lstrip("_")
+            try:
+                values[name] = getattr(obj, name)
+            except AttributeError:
+                continue  # Not readable, like the password hash
+        object.__setattr__(self, "_values", values)
+
+    def __getattr__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshots are read-only")
+
+    def __reduce__(self):
+        return snapshot_from_values, (self._values,)
+
+    def __repr__(self):
+        return f"Snapshot({self._values!r})"
+
+def snapshot_values(snapshot):
+    """Copy of the column values of the snapshot, by attribute name"""
+    return dict(snapshot._values)
+
+def snapshot_from_values(values):
+    snapshot = object.__new__(Snapshot)
+    object.__setattr__(snapshot, "_values", values)
+    return snapshot
+
+class EntityCache:
+    """
+    LRU cache whose entries expire ttl seconds after being stored, with hit and miss
+    counters. An entry stored with a version only hits when read with the same one.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version=0):
+        """Cached value of the key, or None when absent, expired or of another version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic() or entry[2] != version:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, version=0, ttl=None):
+        """Store the value for ttl seconds, bounded by the TTL of the cache"""
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl, version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "size": len(self._entries)
+        }
@@ -1,53 +1,360 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+import threading
+import time
+from sqlalchemy.exc import IntegrityError
+from app.persistence.repository import UNIT_OF_WORK_KEY, decode_cursor, encode_cursor
 from app.persistence.user import UserRepository
 from app.persistence.amenities import AmenitiesRepository
-from app.persistence.places import PlacesRepository
+from app.persistence.places import RATING_COUNTS, PlacesRepository
 from app.persistence.reviews import ReviewsRepository
+from app.persistence.revoked_tokens import RevokedTokensRepository
+from app.services.geo_engine import GeoEngine
+from app.services.amenity_index import AmenityIndex
+from app.services.bloom import BloomFilter
+from app.services.cache import EntityCache, Snapshot
+from app.services.password_hasher import PasswordHasher, PasswordHasherUnavailable
 from app.models import *
+from app import db
 
+AFTER_COMMIT_KEY = "after_commit_callbacks"
+
+# Rating aggregates of the places, only written by _update_ratings and repair_place_ratings
+RATING_AGGREGATES = {"review_count", "rating_sum", "rating_average", *RATING_COUNTS}
+
+# What the authorization checks need to know about the user of a verified token
+Principal = namedtuple("Principal", ("exists", "is_admin"))
 
 class HBnBFacade:
-    def __init__(self):
+    def __init__(self, entity_cache=None, shared_cache=None, password_hasher=None, revocation_filter=(100000, 5),
+                 revocation_signal=None, places_signal=None):
+        """
+        entity_cache maps "user", "place", "amenity" and "principal" to the (max_size, ttl)
+        of their process-local cache, shared_cache is the optional SharedCache behind them.
+        password_hasher hashes and checks the passwords, inline when not given.
+        revocation_filter is the (capacity, refresh interval in seconds) of the bloom filter
+        of the revoked tokens, revocation_signal the GenerationCounter bumped by each revocation
+        so that the other processes of the host reload it. places_signal is the GenerationCounter
+        bumped by the writes to the places and their amenities, upon which the other processes
+        reload their geo engine and amenity index.
+        """
         self.user_repo = UserRepository()
         self.place_repo = PlacesRepository()
         self.review_repo = ReviewsRepository()
         self.amenity_repo = AmenitiesRepository()
+        self.revoked_token_repo = RevokedTokensRepository()
+        self.geo_engine = GeoEngine() if GeoEngine.available() else None
+        self.amenity_index = AmenityIndex()
+        self.caches = {
+            name: EntityCache(*(entity_cache or {}).get(name, (0, 0)))
+            for name in ("user", "place", "amenity", "principal")
+        }
+        self.shared_cache = shared_cache
+        self.password_hasher = password_hasher or PasswordHasher(workers=0)
+        self.revocation_capacity, self.revocation_refresh = revocation_filter
+        self.revocation_signal = revocation_signal
+        self._revocation_lock = threading.Lock()
+        self._revocation_filter = None
+        self._revocation_version = None
+        self._revocation_loaded_at = 0
+        self.places_signal = places_signal
+        self._places_generation = places_signal.value if places_signal is not None else 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Unit of work: the repository writes made inside the block are committed
+        once at its end, or all rolled back if it raises. Nested blocks join the
+        outermost one.
+        """
+        info = db.session.info
+        depth = info.get(UNIT_OF_WORK_KEY, 0)
+        info[UNIT_OF_WORK_KEY] = depth + 1
+        try:
+            yield
+            if depth == 0:
+                db.session.commit()
+                for callback in info.pop(AFTER_COMMIT_KEY, []):
+                    callback()
+        except Exception:
+            if depth == 0:
+                db.session.rollback()
+            raise
+        finally:
+            info[UNIT_OF_WORK_KEY] = depth
+            if depth == 0:
+                info.pop(AFTER_COMMIT_KEY, None)
+
+    def _after_commit(self, callback):
+        """Run the callback once the writes made so far are committed: now, or at the end of the open unit of work"""
+        info = db.session.info
+        if info.get(UNIT_OF_WORK_KEY, 0):
+            info.setdefault(AFTER_COMMIT_KEY, []).append(callback)
+        else:
+            callback()
+
+    def _place_moved(self, place_id, latitude, longitude):
+        if self.geo_engine is not None:
+            self._after_commit(lambda: self.geo_engine.upsert(place_id, latitude, longitude))
+        self._after_commit(self._places_changed)
+
+    def _place_removed(self, place_id):
+        self._invalidate("place", place_id)
+        if self.geo_engine is not None:
+            self._after_commit(lambda: self.geo_engine.remove(place_id))
+        self._after_commit(lambda: self.amenity_index.remove_place(place_id))
+        self._after_commit(self._places_changed)
+
+    def _places_changed(self):
+        """
+        Tell the other processes of the host that their geo engine and amenity index are
+        stale. The indexes of this process, already updated, stay current unless another
+        process changed the places since they were last synced.
+        """
+        if self.places_signal is None:
+            return
+        generation = self.places_signal.bump()
+        if generation - 1 == self._places_generation:
+            self._places_generation = generation
+
+    def _sync_place_indexes(self):
+        """Mark the geo engine and the amenity index to be reloaded when another process changed the places"""
+        if self.places_signal is None:
+            return
+        generation = self.places_signal.value
+        if generation != self._places_generation:
+            self._places_generation = generation
+            if self.geo_engine is not None:
+                self.geo_engine.invalidate()
+            self.amenity_index.invalidate()
+
+    def _cached_get(self, name, repo, obj_id):
+        """
+        Read-through: snapshot of the entity from the process-local cache, then from the
+        shared one, or read from the repository and cached in both. Entries are looked up
+        with the version of the entity in the shared cache, if any. Reads made inside a unit
+        of work may see uncommitted rows and are not cached.
+        """
+        cache = self.caches[name]
+        version = self.shared_cache.version(f"{name}:{obj_id}") if self.shared_cache else 0
+        shared_key = f"{name}:{obj_id}:{version}"
+
+        snapshot = cache.get(obj_id, version)
+        if snapshot is None and self.shared_cache is not None and cache.max_size > 0:
+            snapshot = self.shared_cache.get(shared_key)
+            if snapshot is not None:
+                cache.set(obj_id, snapshot, version)
+
+        if snapshot is None:
+            obj = repo.get(obj_id)
+            if obj is None:
+                return None
+            snapshot = Snapshot(obj)
+            if not db.session.info.get(UNIT_OF_WORK_KEY, 0):
+                cache.set(obj_id, snapshot, version)
+                if self.shared_cache is not None and cache.max_size > 0:
+                    self.shared_cache.set(shared_key, snapshot, cache.ttl)
+        return snapshot
+
+    def _invalidate(self, name, obj_id):
+        """
+        Drop the cached entity now and once the current writes are committed, bumping its
+        shared version so that the other processes drop it as well.
+        """
+        cache = self.caches[name]
+
+        def invalidate():
+            cache.invalidate(obj_id)
+            if self.shared_cache is not None:
+                self.shared_cache.bump(f"{name}:{obj_id}")
+
+        invalidate()
+        self._after_commit(invalidate)
+
+    def cache_stats(self):
+        return {name: cache.stats() for name, cache in self.caches.items()}
+
+    def _create_many(self, repo, build, items):
+        """
+        Build an object from each item and insert the valid ones in one statement.
+        Return, for each item, the created object or the exception which rejected it.
+        """
+        results = []
+        for data in items:
+            try:
+                results.append(build(data))
+            except (ValueError, TypeError, KeyError) as e:
+                results.append(e)
+        built = [index for index, obj in enumerate(results) if not isinstance(obj, Exception)]
+        errors = repo.add_many([results[index] for index in built])
+        for index, error in zip(built, errors):
+            if error is not None:
+                results[index] = error
+        return results
 
     def create_user(self, user_data):
+        user_data = dict(user_data)
+        password_hash = self.password_hasher.hash(user_data.pop("password", None))
         user = User(**user_data)
+        user.password_hash = password_hash
         self.user_repo.add(user)
         return user
 
+    def verify_password(self, user, password):
+        """
+        Whether the password is the one of the user, checked by the password hasher. Out of
+        a unit of work the session is closed first, giving its database connection back to
+        the pool instead of holding it while the hash runs: the loaded attributes of the
+        user stay readable.
+        """
+        password_hash = user.password_hash
+        if not db.session.info.get(UNIT_OF_WORK_KEY, 0):
+            db.session.close()
+        return self.password_hasher.check(password_hash, password)
+
+    def rehash_password(self, user, password):
+        """
+        Store a hash of the configured cost of the password, once verified, when the
+        stored one has another cost. Skipped when the password hasher is saturated:
+        the next login will do it.
+        """
+        if not self.password_hasher.needs_rehash(user.password_hash):
+            return False
+        try:
+            self.update_user(user.id, {"password": password})
+        except PasswordHasherUnavailable:
+            return False
+        return True
+
     def get_user(self, user_id):
-        return self.user_repo.get(user_id)
+        return self._cached_get("user", self.user_repo, user_id)
+
+    def get_principal(self, user_id, issued_at):
+        """
+        Principal of the user of a verified token, cached by user: the entry serves the tokens
+        issued before it was read, whatever their session, and a token issued after it (a new
+        login) reads it again. Dropped by update_user.
+        """
+        cache = self.caches["principal"]
+        version = self.shared_cache.version(f"principal:{user_id}") if self.shared_cache else 0
+        entry = cache.get(user_id, version)
+        if entry is not None and (issued_at is None or issued_at <= entry[1]):
+            return entry[0]
+
+        read_at = time.time()
+        row = self.user_repo.get_many([user_id], ("is_admin",))[0]
+        principal = Principal(row is not None, bool(row is not None and row.is_admin))
+        if not db.session.info.get(UNIT_OF_WORK_KEY, 0):
+            cache.set(user_id, (principal, read_at), version)
+        return principal
+
+    def get_users_by_ids(self, user_ids, columns=None):
+        return self.user_repo.get_many(user_ids, columns)
 
     def get_user_by_email(self, email):
         return self.user_repo.get_user_by_email(email)
 
     def update_user(self, user_id, user_data):
-        return self.user_repo.update(user_id, user_data)
+        if "password" in user_data:
+            user_data = dict(user_data)
+            user_data["password_hash"] = self.password_hasher.hash(user_data.pop("password"))
+        user = self.user_repo.update(user_id, user_data)
+        self._invalidate("user", user_id)
+        self._invalidate("principal", user_id)
+        return user
 
     def get_all_users(self):
         return self.user_repo.get_all()
 
+    def _revoked_tokens_filter(self):
+        """
+        Bloom filter of the jti of the revoked tokens, loaded on first use. It is loaded again
+        when a process of the host revoked a token (the revocation signal changed), and every
+        revocation_refresh seconds for the revocations made on other hosts.
+        """
+        version = self.revocation_signal.value if self.revocation_signal is not None else 0
+        with self._revocation_lock:
+            stale = time.monotonic() - self._revocation_loaded_at > self.revocation_refresh
+            if self._revocation_filter is None or version != self._revocation_version or stale:
+                jtis = self.revoked_token_repo.get_active_jtis()
+                bloom = BloomFilter(max(self.revocation_capacity, 2 * len(jtis)))
+                for jti in jtis:
+                    bloom.add(jti)
+                self._revocation_filter = bloom
+                self._revocation_version = version
+                self._revocation_loaded_at = time.monotonic()
+            return self._revocation_filter
+
+    def is_token_revoked(self, jti):
+        """Whether the token was revoked: no query unless the bloom filter holds the jti"""
+        if jti not in self._revoked_tokens_filter():
+            return False
+        return self.revoked_token_repo.is_revoked(jti)
+
+    def revoke_token(self, claims):
+        """Revoke the token of the decoded claims until it expires, dropping the revocations which expired"""
+        token = RevokedToken(
+            jti=claims["jti"],
+            token_type=claims["type"],
+            user_id=claims["sub"]["id"],
+            expires_at=datetime.fromtimestamp(claims["exp"])
+        )
+        try:
+            with self.transaction():
+                self.revoked_token_repo.purge_expired()
+                self.revoked_token_repo.add(token)
+        except IntegrityError:
+            # Revoked at the same time by another request (unique jti): already done
+            if self.revoked_token_repo.is_revoked(token.jti):
+                return token
+            raise
+
+        def revoked():
+            self._revoked_tokens_filter().add(token.jti)
+            if self.revocation_signal is not None:
+                self.revocation_signal.bump()
+
+        self._after_commit(revoked)
+        return token
+
+    def get_users_page(self, limit, cursor=None, columns=None):
+        return self.user_repo.get_page(limit, cursor, columns)
+
     def create_amenity(self, amenity_data):
         amenity = Amenity(**amenity_data)
         self.amenity_repo.add(amenity)
         return amenity
 
+    def _build_amenity(self, amenity_data):
+        return Amenity(name=amenity_data["name"])
+
+    def create_amenities(self, amenities_data):
+        return self._create_many(self.amenity_repo, self._build_amenity, amenities_data)
+
     def get_amenity(self, amenity_id):
-        return self.amenity_repo.get_by_attribute('id', amenity_id)
+        return self._cached_get("amenity", self.amenity_repo, amenity_id)
 
     def get_all_amenities(self):
         return self.amenity_repo.get_all()
 
+    def get_amenities_page(self, limit, cursor=None, columns=None):
+        return self.amenity_repo.get_page(limit, cursor, columns)
+
     def update_amenity(self, amenity_id, amenity_data):
-        return self.amenity_repo.update(amenity_id, amenity_data)
+        amenity = self.amenity_repo.update(amenity_id, amenity_data)
+        self._invalidate("amenity", amenity_id)
+        return amenity
 
     def delete_amenity(self, amenity_id):
-        return self.amenity_repo.delete(amenity_id)
+        result = self.amenity_repo.delete(amenity_id)
+        self._invalidate("amenity", amenity_id)
+        self._after_commit(lambda: self.amenity_index.remove_amenity(amenity_id))
+        self._after_commit(self._places_changed)
+        return result
 
-    def create_place(self, place_data):
-        place = Place(
+    def _build_place(self, place_data):
+        return Place(
             title=place_data["title"],
             description=place_data["description"],
             price=place_data["price"],
@@ -56,40 +363,208 @@ class HBnBFacade:
             _owner_id=place_data["owner"]
         )
 
+    def create_place(self, place_data):
+        place = self._build_place(place_data)
         self.place_repo.add(place)
+        self._place_moved(place.id, place.latitude, place.longitude)
         return place
 
+    def create_places(self, places_data):
+        results = self._create_many(self.place_repo, self._build_place, places_data)
+        for place in results:
+            if not isinstance(place, Exception):
+                self._place_moved(place.id, place.latitude, place.longitude)
+        return results
+
+    def get_places_by_ids(self, place_ids, columns=None):
+        return self.place_repo.get_many(place_ids, columns)
+
+    def search_places_nearby(self, lat, lng, radius_km, limit, cursor=None, columns=()):
+        return self.place_repo.search_nearby(lat, lng, radius_km, limit, cursor, columns)
+
+    def search_places_in_bbox(self, bbox, limit, cursor=None, columns=()):
+        return self.place_repo.search_in_bbox(*bbox, limit, cursor, columns)
+
+    def search_places_text(self, query, limit, cursor=None, columns=()):
+        return self.place_repo.search_text(query, limit, cursor, columns)
+
+    def nearest_places(self, lat, lng, k, columns=None):
+        """
+        The k places nearest to the point as (place, distance_km), computed by the
+        in-process geo engine, which is loaded from the database on first use.
+        """
+        self._sync_place_indexes()
+        if not self.geo_engine.loaded:
+            self.geo_engine.load(self.place_repo.get_coordinates())
+
+        hits = self.geo_engine.nearest(lat, lng, k)
+        places = self.place_repo.get_many([place_id for place_id, _ in hits], columns)
+        return [(place, distance) for place, (_, distance) in zip(places, hits) if place is not None]
+
+    def get_existing_place_ids(self, place_ids):
+        return self.place_repo.existing_ids(place_ids)
+
     def get_place(self, place_id):
-        return self.place_repo.get(place_id)
+        return self._cached_get("place", self.place_repo, place_id)
+
+    def get_place_details(self, place_id, with_reviewers=False):
+        """
+        Return the place with its owner, its reviews (joined with their author when
+        with_reviewers is set) and its amenities, in three queries whatever the number
+        of reviews, or None if the place does not exist.
+        """
+        place = self.place_repo.get_with_owner(place_id)
+        if not place:
+            return None
+        reviews = self.review_repo.get_by_place(place_id, with_reviewers)
+        return place, reviews, self.amenity_repo.get_by_place(place_id)
 
     def get_all_places(self):
         return self.place_repo.get_all()
 
+    def get_places_page(self, limit, cursor=None, columns=None, min_price=None, max_price=None,
+                        sort="created_at", descending=False):
+        return self.place_repo.get_page(limit, cursor, columns, min_price, max_price, sort, descending)
+
+    def get_places_page_by_distance(self, lat, lng, limit, cursor=None, columns=(), min_price=None, max_price=None):
+        return self.place_repo.get_page_by_distance(lat, lng, limit, cursor, columns, min_price, max_price)
+
+    def filter_places_by_amenities(self, amenity_ids, match_all, limit, cursor=None, columns=None,
+                                   min_price=None, max_price=None):
+        """
+        Page of the places having all (or any) of the amenities, found through the
+        in-process amenity index, which is loaded from the database on first use.
+        Return the places, the cursor of the next page, the number of matching places
+        and the facet counts (matching places per amenity). The count and the facets
+        ignore the price bounds, which are only applied to the fetched rows.
+        """
+        self._sync_place_indexes()
+        if not self.amenity_index.loaded:
+            self.amenity_index.load(self.place_repo.get_amenity_links())
+
+        matched = self.amenity_index.match(amenity_ids, match_all)
+        criteria = self.place_repo.price_criteria(min_price, max_price)
+        after = decode_cursor(cursor, datetime.fromisoformat, str) if cursor else None
+
+        places = []
+        while len(places) <= limit:
+            keys = self.amenity_index.place_keys(matched, after, limit + 1 - len(places))
+            if not keys:
+                break
+            places += [place for place in self.place_repo.get_many([key[1] for key in keys], columns, criteria) if place is not None]
+            after = keys[-1]
+
+        next_cursor = None
+        if len(places) > limit:
+            places = places[:limit]
+            next_cursor = encode_cursor(places[-1].created_at, places[-1].id)
+        return places, next_cursor, matched.bit_count(), self.amenity_index.facets(matched)
+
     def get_place_by_user(self, user_id):
         return self.place_repo.get_by_attribute("id", user_id)
 
     def update_place(self, place_id, place_data):
-        return self.place_repo.update(place_id, place_data)
+        """Update the place, raising ValueError when the data sets one of its rating aggregates"""
+        if any(key.lstrip("_") in RATING_AGGREGATES for key in place_data):
+            raise ValueError("Rating aggregates are read-only")
+        place = self.place_repo.update(place_id, place_data)
+        self._invalidate("place", place_id)
+        if place and ("latitude" in place_data or "longitude" in place_data):
+            self._place_moved(place.id, place.latitude, place.longitude)
+        return place
 
     def delete_place(self, place_id):
-        return self.place_repo.delete(place_id)
+        self.place_repo.delete(place_id)
+        self._place_removed(place_id)
+
+    def delete_place_cascade(self, place_id):
+        self.place_repo.delete_cascade(place_id)
+        self._place_removed(place_id)
+
+    def add_amenity_to_place(self, place, amenity):
+        """
+        Link the place and the amenity, given as instances or snapshots, or return None
+        when one of them was deleted since, by another worker for instance.
+        """
+        place_id, created_at, amenity_id = place.id, place.created_at, amenity.id
+        place, amenity = self.place_repo.get(place_id), self.amenity_repo.get(amenity_id)
+        if not place or not amenity:
+            return None
+        self.place_repo.add_amenity(place, amenity)
+        self._invalidate("place", place_id)
+        self._invalidate("amenity", amenity_id)
+        self._after_commit(lambda: self.amenity_index.link(place_id, created_at, amenity_id))
+        self._after_commit(self._places_changed)
+        return place
 
     def create_review(self, review_data):
         review = Review(**review_data)
-        self.review_repo.add(review)
+        with self.transaction():
+            self.review_repo.add(review)
+            self._update_ratings(review.place_id, added=[review.rating])
         return review
 
+    def _build_review(self, review_data):
+        return Review(
+            text=review_data["text"],
+            rating=review_data["rating"],
+            place_id=review_data["place_id"],
+            user_id=review_data["user_id"]
+        )
+
+    def create_reviews(self, reviews_data):
+        with self.transaction():
+            results = self._create_many(self.review_repo, self._build_review, reviews_data)
+            ratings = {}
+            for review in results:
+                if not isinstance(review, Exception):
+                    ratings.setdefault(review.place_id, []).append(review.rating)
+            for place_id, added in ratings.items():
+                self._update_ratings(place_id, added=added)
+        return results
+
     def get_review(self, review_id):
         return self.review_repo.get(review_id)
 
     def get_all_reviews(self):
         return self.review_repo.get_all()
 
-    def get_reviews_by_place(self, place_id):
-        return self.review_repo.get_by_attribute('place_id', place_id)
+    def get_reviews_page(self, limit, cursor=None, columns=None):
+        return self.review_repo.get_page(limit, cursor, columns)
+
+    def get_reviews_by_place(self, place_id, with_reviewers=False):
+        return self.review_repo.get_by_place(place_id, with_reviewers)
 
     def update_review(self, review_id, review_data):
-        return self.review_repo.update(review_id, review_data)
+        with self.transaction():
+            review = self.review_repo.get(review_id)
+            if not review:
+                return None
+            place_id, rating = review.place_id, review.rating
+            self.review_repo.update(review_id, review_data)
+            if (review.place_id, review.rating) != (place_id, rating):
+                self._update_ratings(place_id, removed=[rating])
+                self._update_ratings(review.place_id, added=[review.rating])
+        return review
 
     def delete_review(self, review_id):
-        return self.review_repo.delete(review_id)
+        with self.transaction():
+            review = self.review_repo.get(review_id)
+            if not review:
+                return None
+            place_id, rating = review.place_id, review.rating
+            self.review_repo.delete(review_id)
+            self._update_ratings(place_id, removed=[rating])
+
+    def _update_ratings(self, place_id, added=(), removed=()):
+        self.place_repo.update_ratings(place_id, added, removed)
+        self._invalidate("place", place_id)
+
+    def repair_place_ratings(self):
+        """Recompute the rating aggregates, bumping the version of every place so that the other processes drop them"""
+        self.place_repo.repair_ratings()
+        with self.transaction():
+            for place in self.place_repo.project():
+                self._invalidate("place", place.id)
+        if self.shared_cache is not None:
+            self.shared_cache.clear("place:")
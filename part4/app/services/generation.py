@@ -0,0 +1,43 @@
+"""
+Generation counter shared by the worker processes of a host.
+
+The counter is 8 bytes of a file mapped in memory by every process: reading it is a
+memory read, without system call nor query, cheap enough to be done on every request.
+A process bumps it after changing shared state (like revoking a token) and the others
+notice the new value at their next read and reload that state.
+"""
+
+import mmap
+import os
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent bumps may then count once, still changing the value
+    fcntl = None
+
+COUNTER = struct.Struct("<Q")
+
+class GenerationCounter:
+    def __init__(self, path):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < COUNTER.size:
+                os.ftruncate(fd, COUNTER.size)
+            self._map = mmap.mmap(fd, COUNTER.size)
+        finally:
+            os.close(fd)
+
+    @property
+    def value(self):
+        return COUNTER.unpack_from(self._map)[0]
+
+    def bump(self):
+        """Increment the counter, under an exclusive lock of the file against the other processes"""
+        with open(self.path, "r+b") as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            value = self.value + 1
+            COUNTER.pack_into(self._map, 0, value)
+        return value
@@ -0,0 +1,135 @@
+"""
+In-process nearest-neighbour engine over the coordinates of the places.
+
+The coordinates live in contiguous NumPy arrays and the haversine distances
+to a point are computed for every place at once. NumPy is optional: without
+it the engine is unavailable and HBnBFacade.geo_engine is None.
+"""
+
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from app.persistence.geo import EARTH_RADIUS_KM
+
+class GeoEngine:
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._size = 0
+        self._ids = []
+        self._slots = {}
+        self._lat = np.empty(self.INITIAL_CAPACITY)
+        self._lng = np.empty(self.INITIAL_CAPACITY)
+        self._cos_lat = np.empty(self.INITIAL_CAPACITY)
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def __len__(self):
+        return self._size
+
+    def invalidate(self):
+        """Mark the engine to be loaded again at its next use"""
+        with self._lock:
+            self._loaded = False
+
+    def load(self, rows):
+        """(Re)build the engine from (id, latitude, longitude) rows"""
+        with self._lock:
+            self._size = 0
+            self._ids = []
+            self._slots = {}
+            for place_id, lat, lng in rows:
+                self._insert(place_id, lat, lng)
+            self._loaded = True
+
+    def upsert(self, place_id, lat, lng):
+        """Add a place, or move it if already known. Ignored until the engine is loaded."""
+        with self._lock:
+            if not self._loaded:
+                return
+            slot = self._slots.get(place_id)
+            if slot is None:
+                self._insert(place_id, lat, lng)
+            else:
+                self._set(slot, lat, lng)
+
+    def remove(self, place_id):
+        """Forget a place, moving the last one into its slot to keep the arrays contiguous"""
+        with self._lock:
+            slot = self._slots.pop(place_id, None)
+            if slot is None:
+                return
+
+            last = self._size - 1
+            if slot != last:
+                moved_id = self._ids[last]
+                self._ids[slot] = moved_id
+                self._slots[moved_id] = slot
+                self._lat[slot] = self._lat[last]
+                self._lng[slot] = self._lng[last]
+                self._cos_lat[slot] = self._cos_lat[last]
+            self._ids.pop()
+            self._size = last
+
+    def nearest(self, lat, lng, k):
+        """The k places nearest to the point, as (id, distance_km) sorted by distance"""
+        with self._lock:
+            if k <= 0 or not self._size:
+                return []
+            distances = self._distances(lat, lng)
+            if k < self._size:
+                candidates = np.argpartition(distances, k - 1)[:k]
+            else:
+                candidates = np.arange(self._size)
+            return self._sorted_hits(candidates, distances)
+
+    def within(self, lat, lng, radius_km):
+        """The places within radius_km of the point, as (id, distance_km) sorted by distance"""
+        with self._lock:
+            if not self._size:
+                return []
+            distances = self._distances(lat, lng)
+            return self._sorted_hits(np.flatnonzero(distances <= radius_km), distances)
+
+    def _insert(self, place_id, lat, lng):
+        if self._size == len(self._lat):
+            self._grow()
+        slot = self._size
+        self._size += 1
+        self._ids.append(place_id)
+        self._slots[place_id] = slot
+        self._set(slot, lat, lng)
+
+    def _set(self, slot, lat, lng):
+        self._lat[slot] = np.radians(lat)
+        self._lng[slot] = np.radians(lng)
+        self._cos_lat[slot] = np.cos(self._lat[slot])
+
+    def _grow(self):
+        capacity = 2 * len(self._lat)
+        for name in ("_lat", "_lng", "_cos_lat"):
+            array = np.empty(capacity)
+            array[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, array)
+
+    def _distances(self, lat, lng):
+        lat, lng = np.radians(lat), np.radians(lng)
+        a = np.sin((self._lat[:self._size] - lat) / 2) ** 2 \
+            + np.cos(lat) * self._cos_lat[:self._size] * np.sin((self._lng[:self._size] - lng) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def _sorted_hits(self, candidates, distances):
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        return [(self._ids[slot], float(distances[slot])) for slot in candidates]
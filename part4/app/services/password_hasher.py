@@ -0,0 +1,156 @@
+"""
+Password hashing run out of the request threads.
+
+bcrypt is slow on purpose, tens to hundreds of milliseconds of CPU per hash or
+check. Run in the request thread it holds a worker of the web server for that
+long and a burst of logins queues every other request behind it. PasswordHasher
+sends the work to a pool of processes, one per core by default, so that the
+checks run in parallel. The number of hashes pending in the pool is bounded:
+past the limit, or when a hash takes longer than the timeout, the caller gets
+PasswordHasherUnavailable at once instead of piling up behind the others.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+class PasswordHasherUnavailable(Exception):
+    """The hashing pool is saturated, or did not answer in time"""
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+def check_password(password_hash, password):
+    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 16
+
+def hash_rounds(password_hash):
+    """bcrypt cost of a hash like $2b$12$..., None when it is not a bcrypt hash"""
+    parts = password_hash.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+def calibrate_rounds(target_ms, minimum=MIN_ROUNDS, maximum=MAX_ROUNDS):
+    """Highest bcrypt cost whose hash takes at most target_ms milliseconds on this machine, at least minimum"""
+    rounds = minimum
+    while rounds < maximum:
+        start = time.perf_counter()
+        hash_password("calibration", rounds + 1)
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        rounds += 1
+    return rounds
+
+def calibrated_rounds(path, target_ms):
+    """
+    calibrate_rounds(target_ms), measured by the first process of the host and stored
+    in the JSON file at path: the other workers, and the next starts, read that cost
+    instead of measuring their own, which could differ by a step.
+    """
+    try:
+        with open(path) as file:
+            calibration = json.load(file)
+        if calibration.get("target_ms") == target_ms:
+            return int(calibration["rounds"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    rounds = calibrate_rounds(target_ms)
+    temporary_path = f"{path}.{os.getpid()}"
+    with open(temporary_path, "w") as file:
+        json.dump({"target_ms": target_ms, "rounds": rounds}, file)
+    os.replace(temporary_path, path)
+    return rounds
+
+class PasswordHasher:
+    def __init__(self, workers=None, max_pending=64, timeout=5.0, rounds=12):
+        """
+        workers is the size of the process pool, one per core when None. With 0 workers
+        the hashes run inline in the calling thread. max_pending bounds the hashes queued
+        or running in the pool, timeout is the number of seconds to wait for one.
+        """
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.rounds = rounds
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def hash(self, password):
+        if not password:
+            raise ValueError("Password is required")
+        return self._run(hash_password, password, self.rounds)
+
+    def check(self, password_hash, password):
+        if not password or not password_hash:
+            return False
+        return self._run(check_password, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """
+        Whether the hash was made with a lower cost than the configured one, or more than
+        one step higher: a hash one step above is kept, so that two processes configured
+        one step apart do not rehash the same password back and forth.
+        """
+        rounds = hash_rounds(password_hash)
+        return rounds is None or not self.rounds <= rounds <= self.rounds + 1
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        return {"workers": self.workers, "max_pending": self.max_pending, "rejected": self.rejected}
+
+    def _executor(self):
+        # The pool is started on first use, and again in a forked worker process of the server.
+        # Its processes come from a forkserver, not forked from this multithreaded process
+        # which could hold a lock of another thread (logging, the database driver...) forever.
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver"))
+                self._pid = os.getpid()
+            return self._pool
+
+    def _reject(self, message):
+        with self._lock:
+            self.rejected += 1
+        raise PasswordHasherUnavailable(message)
+
+    def _run(self, function, *args):
+        if self.workers <= 0:
+            return function(*args)
+
+        # A slot is held until the hash is done in the pool, even when its caller gave up on it
+        if not self._slots.acquire(blocking=False):
+            self._reject("Too many password hashes pending")
+        try:
+            future = self._executor().submit(function, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self.shutdown()
+            raise PasswordHasherUnavailable("Password hashing pool is down")
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            self._reject("Password hashing timed out")
+        except BrokenProcessPool:
+            self.shutdown()
+            raise PasswordHasherUnavailable("Password hashing pool is down")
@@ -0,0 +1,154 @@
+"""
+Second cache tier of HBnBFacade, shared by the worker processes of a host.
+
+Each entity has a version number in the shared tier, bumped by every write
+to it: the cached values are stored under a key holding that version, so a
+write made by one worker hides the entries read by the others, including
+their process-local entries, which are checked against the version.
+
+The values are stored as JSON, never unpickled: anyone able to write to the
+shared tier must not be able to run code in the workers reading it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from app.services.cache import Snapshot, snapshot_from_values, snapshot_values
+
+def _encode(value):
+    if isinstance(value, Snapshot):
+        return {"__snapshot__": snapshot_values(value)}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"{type(value).__name__} cannot be stored in the shared cache")
+
+def _decode(obj):
+    if "__snapshot__" in obj:
+        return snapshot_from_values(obj["__snapshot__"])
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+def dumps(value):
+    """JSON text of the value: JSON types, datetimes and Snapshots"""
+    return json.dumps(value, default=_encode)
+
+def loads(text):
+    return json.loads(text, object_hook=_decode)
+
+class SharedCache(ABC):
+    @abstractmethod
+    def get(self, key):
+        """Value of the key, or None when absent or expired"""
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        pass
+
+    @abstractmethod
+    def version(self, key):
+        """Current version of the key, 0 until it is first bumped"""
+        pass
+
+    @abstractmethod
+    def bump(self, key):
+        """Increment the version of the key"""
+        pass
+
+    @abstractmethod
+    def clear(self, prefix=""):
+        """Drop the values whose key starts with prefix"""
+        pass
+
+class SQLiteSharedCache(SharedCache):
+    """
+    Stand-in shared tier for a single host: a SQLite file in WAL mode, opened by
+    every worker. A networked cache (Redis, memcached...) would implement the same
+    interface for several hosts.
+
+    The versions read are kept in the process for version_ttl seconds, so that the
+    cached reads do not query the file each time: a write made by another worker is
+    seen at most version_ttl seconds late. The bumps made by the process are seen at
+    once.
+    """
+
+    # Number of writes between two purges of the expired values
+    PURGE_INTERVAL = 1000
+
+    # Number of versions kept in the process before dropping the expired ones
+    MAX_VERSIONS = 10000
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS versions (key TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+    ]
+
+    def __init__(self, path, timeout=5.0, version_ttl=0.5):
+        self.path = path
+        self.timeout = timeout
+        self.version_ttl = version_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._versions = {}
+        for statement in self.SCHEMA:
+            self._connection().execute(statement)
+
+    def _connection(self):
+        """Connection of the current thread, reopened in a process forked after its creation"""
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return self._local.connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return loads(row[0]) if row else None
+
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, dumps(value), time.time() + ttl)
+        )
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.PURGE_INTERVAL == 0
+        if purge:
+            connection.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+
+    def version(self, key):
+        now = time.monotonic()
+        cached = self._versions.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        row = self._connection().execute("SELECT version FROM versions WHERE key = ?", (key,)).fetchone()
+        version = row[0] if row else 0
+        with self._lock:
+            if len(self._versions) >= self.MAX_VERSIONS:
+                self._versions = {k: v for k, v in self._versions.items() if v[1] > now}
+            self._versions[key] = (version, now + self.version_ttl)
+        return version
+
+    def bump(self, key):
+        self._connection().execute(
+            "INSERT INTO versions (key, version) VALUES (?, 1) "
+            "ON CONFLICT (key) DO UPDATE SET version = version + 1",
+            (key,)
+        )
+        with self._lock:
+            self._versions.pop(key, None)
+
+    def clear(self, prefix=""):
+        self._connection().execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
@@ -0,0 +1,37 @@
+"""
+Verification of the JWTs sent again and again by the same clients.
+
+The front-end sends the same bearer token with every request, and checks it on every
+page load: flask_jwt_extended decodes it and verifies its HMAC each time.
+CachingJWTManager keeps the claims of the tokens it verified in a bounded LRU, keyed
+by a SHA-256 digest of the raw token, until the token expires. The revocation and
+type checks of flask_jwt_extended still run on the cached claims.
+"""
+
+import time
+from hashlib import sha256
+from flask_jwt_extended import JWTManager
+from app.services.cache import EntityCache
+
+class CachingJWTManager(JWTManager):
+    def __init__(self, app=None, add_context_processor=False):
+        self.verified_tokens = EntityCache(0, 0)
+        super().__init__(app, add_context_processor)
+
+    def init_app(self, app, add_context_processor=False):
+        """The JWT_VERIFIED_TOKEN_CACHE setting is the (max_size, ttl) of the cache, disabled when unset"""
+        super().init_app(app, add_context_processor)
+        self.verified_tokens = EntityCache(*app.config.get("JWT_VERIFIED_TOKEN_CACHE", (0, 0)))
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        # Tokens from cookies are checked against their CSRF value, expired ones decoded on purpose: not cached
+        if csrf_value is not None or allow_expired or self.verified_tokens.max_size <= 0:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = sha256(encoded_token.encode()).digest()
+        claims = self.verified_tokens.get(key)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token)
+            ttl = claims["exp"] - time.time() if "exp" in claims else None
+            self.verified_tokens.set(key, claims, ttl=ttl)
+        return dict(claims)
@@ -26,17 +26,35 @@ async function isTokenValid(token) {
     return data.message || false;
 }
 
-async function fetchPlaces() {
-    return (await (await fetch(`${API_ENDPOINT}/places/`, {
-        method: 'GET',
-        headers: {
-            'Content-Type': 'application/json'
-        }
-    })).json());
+async function fetchPlaces(max_price = null) {
+    let places = [];
+    let cursor = null;
+
+    do {
+        const params = new URLSearchParams();
+        if (max_price !== null)
+            params.set('max_price', max_price);
+        if (cursor)
+            params.set('cursor', cursor);
+
+        const response = await fetch(`${API_ENDPOINT}/places/?${params}`, {
+            method: 'GET',
+            headers: {
+                'Content-Type': 'application/json'
+            }
+        });
+
+        places = places.concat(await response.json());
+        cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+
+    return places;
 }
 
-async function fetchPlaceDetails(token, place_id) {
-    return (await (await fetch(`${API_ENDPOINT}/places/${place_id}`, {
+async function fetchPlaceDetails(token, place_id, expand_user = false) {
+    const url = `${API_ENDPOINT}/places/${place_id}` + (expand_user ? '?expand=user' : '');
+
+    return (await (await fetch(url, {
         method: 'GET',
         headers: {
             'Content-Type': 'application/json',
@@ -93,9 +111,8 @@ async function indexRoute() {
     loginLink.style.display = 'none';
 
     const fetch_place_by_filter = async (filter_name) => {
-        const places = await fetchPlaces();
+        const places = await fetchPlaces(filter_name == "all" ? null : Number(filter_name.replace("$", "")));
         const places_container = document.getElementById("places-container");
-        const fix_filter = filter_name.replace("$", "");
 
         const create_card = (name, price, id) => {
             return `<div class="place-card">
@@ -106,14 +123,8 @@ async function indexRoute() {
         }
 
         places_container.innerHTML = "";
-        places.forEach(async place => {
-            const price = (await fetchPlaceDetails(token, place.id)).price
-
-            if (filter_name != "all" && price > Number(fix_filter))
-                return;
-
-            const card = create_card(place.title, String(price), place.id);
-            places_container.innerHTML += card;
+        places.forEach(place => {
+            places_container.innerHTML += create_card(place.title, String(place.price), place.id);
         });
     }
 
@@ -141,7 +152,7 @@ async function placeRoute() {
     const urlParams = new URLSearchParams(window.location.search);
     const placeId = urlParams.get('id');
 
-    fetchPlaceDetails(token, placeId).then(async data => {
+    fetchPlaceDetails(token, placeId, true).then(data => {
         if (data.error)
             return;
 
@@ -160,9 +171,8 @@ async function placeRoute() {
         const reviews = document.getElementById("reviews-section");
         reviews.innerHTML = "<h2>Reviews</h2>";
 
-        const reviewsPromises = data.reviews.map(async review => {
-            const user = await fetchUserInfo(review.user_id);
-            const user_full_name = user.first_name + " " + user.last_name;
+        data.reviews.forEach(review => {
+            const user_full_name = review.first_name + " " + review.last_name;
             let rating_str = "";
 
             for (let i = 0; i < 5; i++) {
@@ -179,8 +189,6 @@ async function placeRoute() {
             </div>`;
         });
 
-        await Promise.all(reviewsPromises);
-
         reviews.innerHTML += `<a href="add_review.html?id=${placeId}" class="details-button">Add Review</a>`;
     });
 }
@@ -1,16 +1,80 @@
 import os
+from datetime import timedelta
 
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret_key')
     DEBUG = False
 
+    # Let flask-restx pass the JWT errors to the handlers of flask_jwt_extended: expired, invalid and
+    # revoked tokens are answered with 401/422 instead of 500
+    PROPAGATE_EXCEPTIONS = True
+
+    # Keyset pagination of the list endpoints
+    PAGINATION_DEFAULT_LIMIT = 50
+    PAGINATION_MAX_LIMIT = 500
+
+    # Maximum number of items of a bulk creation request
+    BULK_MAX_ITEMS = 5000
+
+    # Largest radius accepted by the places geo search
+    GEO_MAX_RADIUS_KM = 500
+
+    # Read-through cache of the users, places and amenities: (max entries, TTL in seconds).
+    # "principal" caches whether the user of a token exists and is admin, for the authorization checks.
+    ENTITY_CACHE = {
+        "user": (1000, 60),
+        "place": (5000, 30),
+        "amenity": (500, 300),
+        "principal": (10000, 30),
+    }
+
+    # File of the cache tier shared by the worker processes, behind ENTITY_CACHE. Disabled when unset.
+    SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH')
+
+    # Lifetime of the tokens: a short-lived access token, renewed with the refresh token (POST /auth/refresh)
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=15)
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+
+    # Bloom filter in front of the revoked tokens table: (capacity, seconds between reloads). A revocation
+    # reaches the workers of the same host at once, through the memory-mapped counter at
+    # REVOCATION_SIGNAL_PATH (in the instance folder by default), and the other hosts within the reload interval.
+    REVOCATION_FILTER = (100000, 5)
+    REVOCATION_SIGNAL_PATH = os.getenv('REVOCATION_SIGNAL_PATH')
+
+    # Counter bumped by the writes to the places and their amenities, memory-mapped by the workers of
+    # the host (in the instance folder by default): the others reload their geo engine and amenity index.
+    # Workers on other hosts are not signalled, the in-process indexes assume a single host.
+    PLACES_SIGNAL_PATH = os.getenv('PLACES_SIGNAL_PATH')
+
+    # Claims of the JWTs already verified, by digest of the token: (max entries, TTL in seconds, bounded by the expiry)
+    JWT_VERIFIED_TOKEN_CACHE = (10000, 900)
+
+    # Pool of processes hashing and checking the passwords: size (one per core when unset, inline when 0),
+    # hashes pending in the pool before refusing new ones, seconds to wait for a hash
+    PASSWORD_HASH_WORKERS = int(os.environ['PASSWORD_HASH_WORKERS']) if os.getenv('PASSWORD_HASH_WORKERS') else None
+    PASSWORD_HASH_MAX_PENDING = 64
+    PASSWORD_HASH_TIMEOUT = 5.0
+
+    # bcrypt cost of the new password hashes, each step doubles the time of a hash. With BCRYPT_TARGET_MS
+    # the cost is calibrated instead: the highest one hashing within that many milliseconds, measured once
+    # per host and stored at BCRYPT_CALIBRATION_PATH (in the instance folder by default). Hashes of a lower
+    # cost, or more than one step higher, are rehashed at the next successful login.
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_TARGET_MS = float(os.environ['BCRYPT_TARGET_MS']) if os.getenv('BCRYPT_TARGET_MS') else None
+    BCRYPT_CALIBRATION_PATH = os.getenv('BCRYPT_CALIBRATION_PATH')
+
 class DevelopmentConfig(Config):
     #TESTING = True
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:///development.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+class TestingConfig(DevelopmentConfig):
+    # Lowest cost bcrypt accepts, to keep the suite fast
+    BCRYPT_LOG_ROUNDS = 4
+
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
@@ -1,6 +1,7 @@
 from app import create_app
 
-app = create_app()
-
+# Created under the guard: the processes of the password hashing pool import this
+# module again, and must not run the startup migrations of the app.
 if __name__ == '__main__':
+    app = create_app()
     app.run(debug=True)
\ No newline at end of file
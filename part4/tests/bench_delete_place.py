@@ -0,0 +1,58 @@
+"""
+Benchmark of the place deletion: python bench_delete_place.py (tests folder)
+
+Compare the former per-review deletion with the set-based cascade
+on a temporary database, for a growing number of reviews.
+"""
+
+import os
+import sys
+import tempfile
+import time
+sys.path.append("..")
+
+from app import create_app, db
+from app.models import Place, Review
+from config import DevelopmentConfig
+
+class BenchConfig(DevelopmentConfig):
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+def create_place(facade, owner, review_count):
+    place = Place(title="Bench", description="Bench place", price=10, latitude=0, longitude=0, _owner_id=owner.id)
+    db.session.add(place)
+    db.session.flush()
+    db.session.add_all(
+        Review(text="Bench review", rating=5, place_id=place.id, user_id=owner.id)
+        for _ in range(review_count)
+    )
+    db.session.commit()
+    return place.id
+
+def delete_per_review(facade, place_id):
+    for review in facade.get_reviews_by_place(place_id):
+        facade.delete_review(review.id)
+    facade.delete_place(place_id)
+
+def bench(facade, owner, delete, review_count):
+    place_id = create_place(facade, owner, review_count)
+    start = time.perf_counter()
+    delete(facade, place_id)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    app = create_app(BenchConfig)
+
+    with app.app_context():
+        import app as application
+        facade = application.facade
+
+        db.create_all()
+        facade.create_user({"first_name": "Bench", "last_name": "Bench", "email": "bench@bench.io", "password": "bench"})
+        owner = facade.get_user_by_email("bench@bench.io")
+
+        print(f"{'reviews':>8} {'per review (ms)':>16} {'cascade (ms)':>13}")
+        for review_count in (10, 100, 500, 1000):
+            loop = bench(facade, owner, delete_per_review, review_count)
+            cascade = bench(facade, owner, lambda f, place_id: f.delete_place_cascade(place_id), review_count)
+            print(f"{review_count:>8} {loop * 1000:>16.2f} {cascade * 1000:>13.2f}")
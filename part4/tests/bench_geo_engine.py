@@ -0,0 +1,68 @@
+"""
+Benchmark of the k-nearest places: python bench_geo_engine.py [place_count] (tests folder)
+
+Compare a naive Python loop over get_all_places() with the NumPy geo engine
+on a temporary database filled with random places.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+sys.path.append("..")
+
+from app import create_app, db
+from app.persistence.geo import haversine_km
+from config import DevelopmentConfig
+
+class BenchConfig(DevelopmentConfig):
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+K = 10
+
+def naive_nearest(facade, lat, lng, k):
+    distances = sorted(
+        (haversine_km(lat, lng, place.latitude, place.longitude), place.id)
+        for place in facade.get_all_places()
+    )
+    return distances[:k]
+
+def queries_per_second(function, points):
+    start = time.perf_counter()
+    for lat, lng in points:
+        function(lat, lng)
+    return len(points) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    place_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    app = create_app(BenchConfig)
+
+    with app.app_context():
+        import app as application
+        facade = application.facade
+
+        if facade.geo_engine is None:
+            sys.exit("The geo engine needs numpy")
+
+        db.create_all()
+        owner = facade.create_user({"first_name": "Bench", "last_name": "Bench", "email": "bench@bench.io", "password": "bench"})
+        facade.create_places([{
+            "title": f"Place {i}", "description": "Bench place", "price": 10, "owner": owner.id,
+            "latitude": random.uniform(-90, 90), "longitude": random.uniform(-180, 180)
+        } for i in range(place_count)])
+
+        points = [(random.uniform(-90, 90), random.uniform(-180, 180)) for _ in range(1000)]
+
+        start = time.perf_counter()
+        facade.geo_engine.load(facade.place_repo.get_coordinates())
+        print(f"{place_count} places, engine loaded in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+        naive = queries_per_second(lambda lat, lng: naive_nearest(facade, lat, lng, K), points[:3])
+        engine = queries_per_second(lambda lat, lng: facade.geo_engine.nearest(lat, lng, K), points)
+        print(f"naive loop over get_all_places(): {naive:>10.1f} queries/s")
+        print(f"geo engine:                       {engine:>10.1f} queries/s")
+
+        lat, lng = points[0]
+        assert [place_id for _, place_id in naive_nearest(facade, lat, lng, K)] == \
+            [place_id for place_id, _ in facade.geo_engine.nearest(lat, lng, K)]
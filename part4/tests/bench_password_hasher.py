@@ -0,0 +1,64 @@
+"""
+Benchmark of the logins: python bench_password_hasher.py [login_count] [client_threads] (tests folder)
+
+Send concurrent POST /auth/login requests from client threads, checking the
+passwords inline in the request threads then with pools of 1, 2, 4... worker
+processes, up to the number of cores.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append("..")
+
+from app import create_app, db
+from app.services.password_hasher import PasswordHasher
+from config import DevelopmentConfig
+
+class BenchConfig(DevelopmentConfig):
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    PASSWORD_HASH_WORKERS = 0
+
+CREDENTIALS = {"email": "bench@bench.io", "password": "bench"}
+
+def worker_counts():
+    counts, workers = [0], 1
+    while workers < (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+    return counts + [os.cpu_count() or 1]
+
+def logins_per_second(app, login_count, threads):
+    def login(_):
+        response = app.test_client().post("/api/v1/auth/login", json=CREDENTIALS)
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as clients:
+        statuses = list(clients.map(login, range(login_count)))
+    elapsed = time.perf_counter() - start
+    return statuses.count(200) / elapsed, len(statuses) - statuses.count(200)
+
+if __name__ == "__main__":
+    login_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    app = create_app(BenchConfig)
+
+    with app.app_context():
+        import app as application
+        facade = application.facade
+
+        db.create_all()
+        facade.create_user(dict(CREDENTIALS, first_name="Bench", last_name="Bench"))
+
+    print(f"{login_count} logins from {threads} client threads, bcrypt cost {facade.password_hasher.rounds}")
+    for workers in worker_counts():
+        facade.password_hasher = PasswordHasher(workers=workers, max_pending=threads, rounds=facade.password_hasher.rounds)
+        logins_per_second(app, threads, threads)  # Warm up, starts the pool
+
+        rate, failed = logins_per_second(app, login_count, threads)
+        label = f"{workers} worker processes" if workers else "inline"
+        print(f"{label:>20}: {rate:8.1f} logins/s, {failed} failed")
+        facade.password_hasher.shutdown()
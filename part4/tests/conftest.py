@@ -34,6 +34,7 @@ import pytest
 sys.path.append("..")
 
 from app import create_app, db
+from config import TestingConfig
 from typing import Dict
 from flask.testing import FlaskClient
 from utils import AuthenticatedClient, SharedData
@@ -47,7 +48,7 @@ def application():
 @pytest.fixture(scope="session")
 def client():
     global app
-    app = create_app()
+    app = create_app(TestingConfig)
 
     # with app.app_context():
     #     db.create_all()
@@ -27,6 +27,103 @@ class TestUsers:
 
         shared_data.token = result["access_token"]
 
+    def test_refresh_and_revoke_tokens(self, client: FlaskClient, application, shared_data: SharedData):
+        from app import db, facade
+
+        login = dict_without_keys(shared_data.user_payload, ["first_name", "last_name"])
+        tokens = check_response(client.post("/api/v1/auth/login", json=login), status_code=200, expected_payload=["access_token", "refresh_token"])
+        refresher = AuthenticatedClient(client, tokens["refresh_token"])
+
+        result = check_response(refresher.post("/api/v1/auth/refresh"), status_code=200, expected_payload=["access_token"])
+        check_response(AuthenticatedClient(client, result["access_token"]).get("/api/v1/auth/protected"), status_code=200)
+        check_response(AuthenticatedClient(client, tokens["access_token"]).post("/api/v1/auth/refresh"), status_code=422)
+
+        with application.app_context():
+            engine = db.engine
+            facade.is_token_revoked("not revoked")
+            with QueryCounter(engine) as counter:
+                assert not facade.is_token_revoked("not revoked either")
+            assert counter.count == 0
+
+        check_response(refresher.post("/api/v1/auth/logout"), status_code=200)
+        check_response(refresher.post("/api/v1/auth/refresh"), status_code=401)
+        check_response(AuthenticatedClient(client, result["access_token"]).get("/api/v1/auth/protected"), status_code=200)
+
+    def test_revocation_signal(self, client: FlaskClient, application, shared_data: SharedData, tmp_path):
+        from app import facade
+        from app.services import HBnBFacade
+        from app.services.generation import GenerationCounter
+        from flask_jwt_extended import decode_token
+
+        # Two worker processes of a host, sharing the counter file
+        path = str(tmp_path / "revocations.generation")
+        worker_a = HBnBFacade(revocation_filter=(100, 3600), revocation_signal=GenerationCounter(path))
+        worker_b = HBnBFacade(revocation_filter=(100, 3600), revocation_signal=GenerationCounter(path))
+
+        login = dict_without_keys(shared_data.user_payload, ["first_name", "last_name"])
+        refresh_token = client.post("/api/v1/auth/login", json=login).get_json()["refresh_token"]
+        with application.app_context():
+            claims = decode_token(refresh_token)
+            assert not worker_b.is_token_revoked(claims["jti"])
+
+            worker_a.revoke_token(claims)
+            assert worker_b.revocation_signal.value == 1
+            assert worker_b.is_token_revoked(claims["jti"])
+
+            # A concurrent logout of the same token is not an error
+            facade.revoke_token(claims)
+
+    def test_password_hasher(self, client: FlaskClient, application, shared_data: SharedData):
+        from app import facade
+        from app.services.password_hasher import PasswordHasher, PasswordHasherUnavailable
+
+        pool = PasswordHasher(workers=1, rounds=4)
+        password_hash = pool.hash("secret")
+        assert pool.check(password_hash, "secret") and not pool.check(password_hash, "wrong")
+        pool.shutdown()
+
+        saturated = PasswordHasher(workers=1, max_pending=0)
+        with pytest.raises(PasswordHasherUnavailable):
+            saturated.check(password_hash, "secret")
+
+        # The database connection is given back before waiting on the hash
+        with application.app_context():
+            from app import db
+            user = facade.get_user_by_email(shared_data.user_payload["email"])
+            assert facade.verify_password(user, shared_data.user_payload["password"])
+            assert not db.session().in_transaction() and user.id == shared_data.user_id
+
+        hasher, facade.password_hasher = facade.password_hasher, saturated
+        try:
+            login = dict_without_keys(shared_data.user_payload, ["first_name", "last_name"])
+            response = check_response(client.post("/api/v1/auth/login", json=login), status_code=503)
+            assert response == {"error": "Too many login attempts, retry later"}
+        finally:
+            facade.password_hasher = hasher
+
+    def test_rehash_password_on_login(self, client: FlaskClient, application, shared_data: SharedData, tmp_path):
+        from app import facade
+        from app.services.password_hasher import calibrate_rounds, calibrated_rounds, hash_password, hash_rounds
+
+        assert calibrate_rounds(0) == 4
+        path = str(tmp_path / "bcrypt_calibration.json")
+        assert calibrated_rounds(path, 0) == 4
+        with open(path, "w") as file:
+            json.dump({"target_ms": 0, "rounds": 7}, file)
+        assert calibrated_rounds(path, 0) == 7
+
+        # A hash one step above the configured cost is kept, two steps above it is rehashed
+        rounds = application.config["BCRYPT_LOG_ROUNDS"]
+        login = dict_without_keys(shared_data.user_payload, ["first_name", "last_name"])
+        for stored_rounds, expected_rounds in ((rounds + 1, rounds + 1), (rounds + 2, rounds)):
+            with application.app_context():
+                facade.update_user(shared_data.user_id, {"password_hash": hash_password(shared_data.user_payload["password"], stored_rounds)})
+
+            check_response(client.post("/api/v1/auth/login", json=login), status_code=200)
+            with application.app_context():
+                assert hash_rounds(facade.user_repo.get(shared_data.user_id).password_hash) == expected_rounds
+        check_response(client.post("/api/v1/auth/login", json=login), status_code=200)
+
     def test_get_info_user(self, client: FlaskClient, shared_data: SharedData):
         check_response(
             client.get(f"/api/v1/users/{shared_data.user_id}"),
@@ -58,6 +155,50 @@ class TestUsers:
             array_template=shared_data.user_template()
         )
 
+    def test_paginate_users(self, client: FlaskClient, shared_data: SharedData):
+        first_page = client.get("/api/v1/users/?limit=1")
+        first_users = check_response(first_page, status_code=200, array_template=shared_data.user_template())
+        assert len(first_users) == 1
+
+        cursor = first_page.headers.get("X-Next-Cursor")
+        assert cursor != None
+
+        last_page = client.get(f"/api/v1/users/?limit=1&cursor={cursor}")
+        last_users = check_response(last_page, status_code=200, array_template=shared_data.user_template())
+        assert len(last_users) == 1
+        assert last_users[0]["id"] != first_users[0]["id"]
+        assert last_page.headers.get("X-Next-Cursor") == None
+
+        check_response(client.get("/api/v1/users/?cursor=notacursor"), status_code=400)
+        check_response(client.get("/api/v1/users/?limit=0"), status_code=400)
+
+    def test_paginate_users_without_timestamps(self, client: FlaskClient, application, shared_data: SharedData):
+        from app import db
+        from app.persistence.columns import backfill_timestamps
+        from sqlalchemy import text
+
+        # Seeded rows are inserted without created_at/updated_at
+        with application.app_context():
+            db.session.execute(text(
+                "INSERT INTO users (id, first_name, last_name, email, password, is_admin) "
+                "VALUES ('seeded-user', 'Seeded', 'User', 'seeded@hbnb.io', 'x', 0)"
+            ))
+            db.session.commit()
+            assert backfill_timestamps() == {"users": 1}
+
+        try:
+            ids, cursor = [], None
+            while True:
+                page = client.get("/api/v1/users/?limit=1" + (f"&cursor={cursor}" if cursor else ""))
+                ids += [user["id"] for user in check_response(page, status_code=200)]
+                cursor = page.headers.get("X-Next-Cursor")
+                if cursor is None:
+                    break
+            assert "seeded-user" in ids and len(ids) == len(set(ids))
+        finally:
+            with application.app_context():
+                db.session.execute(text("DELETE FROM users WHERE id = 'seeded-user'"))
+                db.session.commit()
 
     def test_modify_user(self, auth_client: AuthenticatedClient, shared_data: SharedData):
         assert shared_data.token != None
@@ -82,4 +223,17 @@ class TestUsers:
             exclude_payload=["password"]
         )
 
-        shared_data.user_payload["first_name"] = "Jean"
\ No newline at end of file
+        shared_data.user_payload["first_name"] = "Jean"
+
+    def test_get_users_by_ids(self, client: FlaskClient, shared_data: SharedData):
+        pablo_id = shared_data.users[0]["id"]
+
+        result = check_response(
+            client.get(f"/api/v1/users/?ids={pablo_id},unknown,{shared_data.user_id}"),
+            status_code=200
+        )
+
+        assert [user["id"] for user in result["items"]] == [pablo_id, shared_data.user_id]
+        assert result["missing"] == ["unknown"]
+
+        check_response(client.get("/api/v1/users/?ids=,"), status_code=400)
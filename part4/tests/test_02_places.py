@@ -2,6 +2,8 @@
 Testing place endpoint
 """
 from utils import *
+from app import db
+from flask_jwt_extended import decode_token
 
 class TestPlaces:
     def test_create_place(self, auth_client: AuthenticatedClient, shared_data: SharedData):
@@ -25,6 +27,38 @@ class TestPlaces:
 
         shared_data.place_id = result["id"]
 
+    def test_principal_cache(self, auth_client: AuthenticatedClient, application, shared_data: SharedData):
+        import time
+        from app import facade
+
+        with application.app_context():
+            engine = db.engine
+            issued_at = 1
+            assert facade.get_principal(shared_data.user_id, issued_at) == (True, False)
+            with QueryCounter(engine) as counter:
+                assert facade.get_principal(shared_data.user_id, issued_at) == (True, False)
+            assert counter.count == 0
+
+            # Another session of the user shares the entry, a token issued after it was read reads it again
+            with QueryCounter(engine) as counter:
+                assert facade.get_principal(shared_data.user_id, issued_at + 1) == (True, False)
+                assert facade.get_principal(shared_data.user_id, issued_at) == (True, False)
+            assert counter.count == 0
+            with QueryCounter(engine) as counter:
+                facade.get_principal(shared_data.user_id, time.time() + 60)
+            assert counter.count == 1
+            assert facade.get_principal("???", issued_at) == (False, False)
+
+            facade.update_user(shared_data.user_id, {"is_admin": True})
+            assert facade.get_principal(shared_data.user_id, issued_at).is_admin
+            facade.update_user(shared_data.user_id, {"is_admin": False})
+            facade.get_principal(shared_data.user_id, decode_token(shared_data.token)["iat"])
+
+        hits = facade.caches["principal"].hits
+        new_place = check_response(auth_client.post("/api/v1/places/", json=shared_data.place_payload), status_code=201)
+        assert facade.caches["principal"].hits == hits + 1
+        auth_client.delete(f"/api/v1/places/{new_place['id']}")
+
     def test_update_place(self, auth_client: AuthenticatedClient, shared_data: SharedData):
         assert shared_data.place_id != None
 
@@ -49,7 +83,7 @@ class TestPlaces:
         check_response(
             auth_client.get(f"/api/v1/places/{shared_data.place_id}"),
             status_code=200,
-            template=shared_data.place_template() + ["id", "reviews", "amenities"],
+            template=shared_data.place_template() + ["id", "reviews", "amenities", "review_count", "rating_average", "rating_histogram"],
             expected_payload=payload_to_array(shared_data.get_place_data())
         )
 
@@ -64,4 +98,218 @@ class TestPlaces:
                 dict_without_keys(shared_data.place_payload, ["price", "owner", "description"])
             ],
             partial_match=True
-        )
\ No newline at end of file
+        )
+
+    def test_filter_places_by_price(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        assert shared_data.place_id != None
+        price = shared_data.place_payload["price"]
+
+        check_response(
+            auth_client.get(f"/api/v1/places/?min_price={price}&max_price={price}"),
+            status_code=200,
+            array_payload=[{"id": shared_data.place_id, "price": price}],
+            partial_match=True
+        )
+
+        assert auth_client.get(f"/api/v1/places/?max_price={price - 1}").get_json() == []
+        assert auth_client.get(f"/api/v1/places/?min_price={price + 1}").get_json() == []
+
+    def test_get_places_by_ids(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        result = check_response(auth_client.get(f"/api/v1/places/batch?ids=unknown,{shared_data.place_id}"), status_code=200)
+        assert [place["id"] for place in result["items"]] == [shared_data.place_id]
+        assert result["missing"] == ["unknown"]
+
+        check_response(auth_client.get("/api/v1/places/batch?ids=,"), status_code=400)
+        check_response(auth_client.get(f"/api/v1/places/?ids={shared_data.place_id}"), status_code=400)
+
+    def test_bulk_create_places(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        assert shared_data.place_id != None
+
+        places = [dict(shared_data.place_payload, title=f"Bulk place {i}") for i in range(3)]
+        invalid_places = [dict(shared_data.place_payload, price=-1), dict(shared_data.place_payload, owner="test")]
+
+        result = check_response(auth_client.post("/api/v1/places/bulk", json=places), status_code=201)
+        assert [item["status"] for item in result] == [201, 201, 201]
+
+        for item, place in zip(result, places):
+            check_response(
+                auth_client.get(f"/api/v1/places/{item['id']}"),
+                status_code=200,
+                expected_payload=[{"title": place["title"]}]
+            )
+            auth_client.delete(f"/api/v1/places/{item['id']}")
+
+        result = check_response(auth_client.post("/api/v1/places/bulk", json=invalid_places), status_code=400)
+        assert [item["error"] for item in result] == ["Invalid input data", "Unauthorized action."]
+
+        ndjson = "\n".join(json.dumps(place) for place in [places[0], invalid_places[0]])
+        result = check_response(
+            auth_client.post("/api/v1/places/bulk", data=ndjson, headers={"Content-Type": "application/x-ndjson"}),
+            status_code=207
+        )
+        assert [item["status"] for item in result] == [201, 400]
+        auth_client.delete(f"/api/v1/places/{result[0]['id']}")
+
+        # Wrong types are rejected per item, like validate=True does for a single place
+        mistyped = [places[0], dict(shared_data.place_payload, title=["x"]), dict(shared_data.place_payload, price="10")]
+        result = check_response(auth_client.post("/api/v1/places/bulk", json=mistyped), status_code=207)
+        assert [item["status"] for item in result] == [201, 400, 400]
+        auth_client.delete(f"/api/v1/places/{result[0]['id']}")
+
+        check_response(auth_client.post("/api/v1/places/bulk", json={}), status_code=400)
+
+    def test_search_places_nearby(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        assert shared_data.place_id != None
+        lat, lng = shared_data.place_payload["latitude"], shared_data.place_payload["longitude"]
+
+        result = check_response(
+            auth_client.get(f"/api/v1/places/search?lat={lat + 0.01}&lng={lng}&radius_km=5"),
+            status_code=200
+        )
+        assert [place["id"] for place in result] == [shared_data.place_id]
+        assert 1.0 < result[0]["distance_km"] < 1.2
+
+        assert auth_client.get(f"/api/v1/places/search?lat={lat - 1}&lng={lng}&radius_km=5").get_json() == []
+
+        check_response(
+            auth_client.get(f"/api/v1/places/search?bbox={lng - 1},{lat - 1},{lng},{lat}"),
+            status_code=200,
+            array_payload=[{"id": shared_data.place_id}],
+            partial_match=True
+        )
+
+        check_response(auth_client.get(f"/api/v1/places/search?lat={lat}&lng={lng}"), status_code=400)
+        check_response(auth_client.get(f"/api/v1/places/search?lat={lat}&lng={lng}&radius_km=-1"), status_code=400)
+        check_response(auth_client.get("/api/v1/places/search?bbox=1,2,3"), status_code=400)
+        check_response(auth_client.get("/api/v1/places/search?bbox=-180,-90,180,90"), status_code=400)
+
+        # Pages of a radius search follow each other in distance order
+        near = [dict(shared_data.place_payload, title=f"Near {i}", latitude=lat + i * 0.001) for i in range(1, 4)]
+        created = [item["id"] for item in auth_client.post("/api/v1/places/bulk", json=near).get_json()]
+        url = f"/api/v1/places/search?lat={lat}&lng={lng}&radius_km=5&limit=2"
+        first_page = auth_client.get(url)
+        second_page = auth_client.get(f"{url}&cursor={first_page.headers['X-Next-Cursor']}")
+        assert [place["id"] for place in first_page.get_json() + second_page.get_json()] == [shared_data.place_id] + created
+        assert second_page.headers.get("X-Next-Cursor") == None
+        for place_id in created:
+            auth_client.delete(f"/api/v1/places/{place_id}")
+
+    def test_nearest_places(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        pytest.importorskip("numpy")
+        assert shared_data.place_id != None
+        lat, lng = shared_data.place_payload["latitude"], shared_data.place_payload["longitude"]
+
+        result = check_response(auth_client.get(f"/api/v1/places/nearest?lat={lat}&lng={lng}&k=1"), status_code=200)
+        assert [(place["id"], place["distance_km"]) for place in result] == [(shared_data.place_id, 0)]
+
+        new_place = auth_client.post("/api/v1/places/", json=dict(shared_data.place_payload, latitude=lat - 0.01)).get_json()
+        result = check_response(auth_client.get(f"/api/v1/places/nearest?lat={lat - 0.01}&lng={lng}&k=2"), status_code=200)
+        assert [place["id"] for place in result] == [new_place["id"], shared_data.place_id]
+
+        auth_client.delete(f"/api/v1/places/{new_place['id']}")
+        result = check_response(auth_client.get(f"/api/v1/places/nearest?lat={lat - 0.01}&lng={lng}&k=2"), status_code=200)
+        assert [place["id"] for place in result] == [shared_data.place_id]
+
+        check_response(auth_client.get(f"/api/v1/places/nearest?lat={lat}&lng={lng}&k=0"), status_code=400)
+
+    def test_nearest_places_signal(self, application, shared_data: SharedData, tmp_path):
+        pytest.importorskip("numpy")
+        from app.services import HBnBFacade
+        from app.services.generation import GenerationCounter
+
+        # Two worker processes of a host, sharing the counter file
+        path = str(tmp_path / "places.generation")
+        worker_a = HBnBFacade(places_signal=GenerationCounter(path))
+        worker_b = HBnBFacade(places_signal=GenerationCounter(path))
+        lat, lng = -shared_data.place_payload["latitude"], -shared_data.place_payload["longitude"]
+
+        with application.app_context():
+            for worker in (worker_a, worker_b):
+                assert worker.nearest_places(lat, lng, 1)[0][0].id == shared_data.place_id
+
+            place = worker_a.create_place(dict(shared_data.place_payload, latitude=lat, longitude=lng, owner=shared_data.user_id))
+            assert worker_b.nearest_places(lat, lng, 1)[0][0].id == place.id
+
+            # The writer updated its own engine in place, it does not reload it
+            worker_a._sync_place_indexes()
+            assert worker_a.geo_engine.loaded
+
+            worker_a.delete_place(place.id)
+            assert worker_b.nearest_places(lat, lng, 1)[0][0].id == shared_data.place_id
+
+    def test_search_places_text(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        assert shared_data.place_id != None
+
+        new_place = auth_client.post("/api/v1/places/", json=dict(
+            shared_data.place_payload, title="Quiet cabin", description="A super view on the lake"
+        )).get_json()
+
+        first_page = auth_client.get("/api/v1/places/search?q=sup&limit=1")
+        result = check_response(first_page, status_code=200)
+        assert [place["id"] for place in result] == [shared_data.place_id]
+
+        cursor = first_page.headers.get("X-Next-Cursor")
+        assert cursor != None
+        result = check_response(auth_client.get(f"/api/v1/places/search?q=sup&limit=1&cursor={cursor}"), status_code=200)
+        assert [place["id"] for place in result] == [new_place["id"]]
+
+        result = check_response(auth_client.get("/api/v1/places/search?q=super+lak"), status_code=200)
+        assert [place["id"] for place in result] == [new_place["id"]]
+
+        auth_client.delete(f"/api/v1/places/{new_place['id']}")
+        assert auth_client.get("/api/v1/places/search?q=cabin").get_json() == []
+
+        check_response(auth_client.get("/api/v1/places/search?q=!!"), status_code=400)
+
+    def test_sort_places(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        assert shared_data.place_id != None
+        lat, lng = shared_data.place_payload["latitude"], shared_data.place_payload["longitude"]
+
+        cheap = auth_client.post("/api/v1/places/", json=dict(shared_data.place_payload, price=100, latitude=lat - 1)).get_json()["id"]
+        expensive = auth_client.post("/api/v1/places/", json=dict(shared_data.place_payload, price=9000, latitude=lat + 2)).get_json()["id"]
+
+        def sorted_ids(query):
+            return [place["id"] for place in check_response(auth_client.get(f"/api/v1/places/?{query}"), status_code=200)]
+
+        assert sorted_ids("sort=price") == [cheap, shared_data.place_id, expensive]
+        assert sorted_ids("sort=-price") == [expensive, shared_data.place_id, cheap]
+        assert sorted_ids("sort=-created_at") == [expensive, cheap, shared_data.place_id]
+        assert sorted_ids(f"sort=distance&lat={lat - 1}&lng={lng}") == [cheap, shared_data.place_id, expensive]
+        assert sorted_ids("sort=price&min_price=200") == [shared_data.place_id, expensive]
+        assert len(sorted_ids("sort=rating")) == 3
+
+        first_page = auth_client.get("/api/v1/places/?sort=-price&limit=2")
+        assert [place["id"] for place in first_page.get_json()] == [expensive, shared_data.place_id]
+        cursor = first_page.headers.get("X-Next-Cursor")
+        assert sorted_ids(f"sort=-price&limit=2&cursor={cursor}") == [cheap]
+
+        first_page = auth_client.get(f"/api/v1/places/?sort=distance&lat={lat}&lng={lng}&limit=1")
+        assert [place["distance_km"] for place in first_page.get_json()] == [0]
+        cursor = first_page.headers.get("X-Next-Cursor")
+        assert sorted_ids(f"sort=distance&lat={lat}&lng={lng}&cursor={cursor}") == [cheap, expensive]
+
+        # From the antipode every place is past the largest ring: the last query reads the whole table
+        antipode = f"lat={-lat}&lng={lng - 180 if lng > 0 else lng + 180}"
+        assert sorted_ids(f"sort=distance&{antipode}") == [expensive, cheap, shared_data.place_id]
+
+        check_response(
+            auth_client.get(f"/api/v1/places/?sort=price&amenities={shared_data.place_id}"),
+            status_code=400,
+            expected_payload=[{"error": "Use /places/batch?ids= and /places/by_amenities?amenities="}]
+        )
+        check_response(auth_client.get("/api/v1/places/?sort=distance"), status_code=400)
+        check_response(auth_client.get("/api/v1/places/?sort=title"), status_code=400)
+        check_response(auth_client.get("/api/v1/places/?sort=price&cursor=notacursor"), status_code=400)
+
+        auth_client.delete(f"/api/v1/places/{cheap}")
+        auth_client.delete(f"/api/v1/places/{expensive}")
+
+    def test_drop_obsolete_indexes(self, application):
+        from app.persistence.indexes import drop_obsolete_indexes
+        from sqlalchemy import inspect, text
+
+        with application.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(text("CREATE INDEX ix_places_price ON places (price)"))
+            drop_obsolete_indexes()
+            assert "ix_places_price" not in {index["name"] for index in inspect(db.engine).get_indexes("places")}
@@ -2,6 +2,7 @@
 Testing Reviews endpoint
 """
 from utils import *
+from app import db
 
 class TestReviews:
     def test_create_reviews(self, auth_client: AuthenticatedClient, shared_data: SharedData):
@@ -58,6 +59,65 @@ class TestReviews:
             partial_match=True
         )
 
+    def test_place_details_query_count(self, auth_client: AuthenticatedClient, application, shared_data: SharedData):
+        assert shared_data.place_id != None
+
+        with application.app_context():
+            engine = db.engine
+
+        with QueryCounter(engine) as before:
+            check_response(auth_client.get(f"/api/v1/places/{shared_data.place_id}"), status_code=200)
+
+        extra_reviews = [
+            auth_client.post("/api/v1/reviews/", json=shared_data.review_payload).get_json()["id"]
+            for _ in range(3)
+        ]
+
+        with QueryCounter(engine) as after:
+            result = check_response(auth_client.get(f"/api/v1/places/{shared_data.place_id}"), status_code=200)
+
+        assert len(result["reviews"]) == 5
+        assert after.count == before.count
+
+        for review_id in extra_reviews:
+            auth_client.delete(f"/api/v1/reviews/{review_id}")
+
+    def test_bulk_create_reviews(self, auth_client: AuthenticatedClient, application, shared_data: SharedData):
+        assert shared_data.place_id != None
+
+        reviews = [
+            dict(shared_data.review_payload, text="Bulk review"),
+            dict(shared_data.review_payload, place_id="unknown"),
+            dict(shared_data.review_payload, user_id=shared_data.users[0]["id"]),
+            dict(shared_data.review_payload, rating=6),
+            dict(shared_data.review_payload, place_id=[shared_data.place_id]),
+            dict(shared_data.review_payload, rating="5"),
+            dict(shared_data.review_payload, id=shared_data.review_id)
+        ]
+
+        result = check_response(auth_client.post("/api/v1/reviews/bulk", json=reviews), status_code=207)
+        assert [item.get("error") for item in result] == [
+            None, "Invalid place id", "Unauthorized action", "Invalid input data", "Invalid input data", "Invalid input data",
+            "Invalid input data"
+        ]
+
+        # A row breaking a constraint only rejects its own item
+        from app import facade
+        from app.models import Review
+        with application.app_context():
+            conflicting = Review(**shared_data.review_payload)
+            conflicting.id = shared_data.review_id
+            results = facade._create_many(facade.review_repo, lambda review: review, [Review(**shared_data.review_payload), conflicting])
+            assert not isinstance(results[0], Exception) and isinstance(results[1], Exception)
+            facade.review_repo.delete(results[0].id)
+
+        check_response(
+            auth_client.get(f"/api/v1/reviews/{result[0]['id']}"),
+            status_code=200,
+            expected_payload=[{"text": "Bulk review"}]
+        )
+        auth_client.delete(f"/api/v1/reviews/{result[0]['id']}")
+
     def test_get_reviews_from_place(self, auth_client: AuthenticatedClient, shared_data: SharedData):
         assert shared_data.place_id != None
 
@@ -72,6 +132,92 @@ class TestReviews:
             array_payload=[r, dict_without_keys(shared_data.reviews[0]["data"], ["place_id"])]
         )
 
+    def test_get_reviews_from_place_with_author(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        assert shared_data.place_id != None
+
+        author = {"first_name": shared_data.user_payload["first_name"], "last_name": shared_data.user_payload["last_name"]}
+        template = array_without_value(shared_data.reviews_template(), ["place_id"]) + ["id", "first_name", "last_name"]
+
+        check_response(
+            auth_client.get(f"/api/v1/reviews/places/{shared_data.place_id}?expand=user"),
+            status_code=200,
+            array_template=template,
+            array_payload=[dict(author, id=shared_data.review_id), dict(author, id=shared_data.reviews[0]["id"])]
+        )
+
+        result = check_response(auth_client.get(f"/api/v1/places/{shared_data.place_id}?expand=user"), status_code=200)
+        assert all(review["first_name"] == author["first_name"] for review in result["reviews"])
+
+        check_response(auth_client.get(f"/api/v1/reviews/places/{shared_data.place_id}?expand=owner"), status_code=400)
+
+    def test_place_rating_aggregates(self, auth_client: AuthenticatedClient, application, shared_data: SharedData, tmp_path):
+        assert shared_data.place_id != None
+
+        def ratings():
+            place = auth_client.get(f"/api/v1/places/{shared_data.place_id}").get_json()
+            return place["review_count"], place["rating_average"], place["rating_histogram"]
+
+        assert ratings() == (2, 4.0, {"1": 0, "2": 0, "3": 1, "4": 0, "5": 1})
+
+        auth_client.put(f"/api/v1/reviews/{shared_data.review_id}", json=dict(shared_data.review_payload, rating=1))
+        assert ratings() == (2, 2.0, {"1": 1, "2": 0, "3": 1, "4": 0, "5": 0})
+
+        check_response(
+            auth_client.get("/api/v1/places/"),
+            status_code=200,
+            array_payload=[{"id": shared_data.place_id, "review_count": 2, "rating_average": 2.0}],
+            partial_match=True
+        )
+
+        with application.app_context():
+            db.session.execute(db.text("UPDATE places SET review_count = 0, rating_sum = 0, rating_1_count = 7"))
+            db.session.commit()
+
+        result = application.test_cli_runner().invoke(args=["repair-ratings"])
+        assert result.exit_code == 0
+        assert ratings() == (2, 2.0, {"1": 1, "2": 0, "3": 1, "4": 0, "5": 0})
+
+        # Only the reviews write the aggregates
+        forged = {"_rating_average": 5.0, "review_count": 500, "rating_5_count": 500}
+        check_response(auth_client.put(f"/api/v1/places/{shared_data.place_id}", json=forged), status_code=400)
+        assert ratings() == (2, 2.0, {"1": 1, "2": 0, "3": 1, "4": 0, "5": 0})
+
+        # The repair drops the aggregates cached by the other workers
+        from app.services import HBnBFacade
+        from app.services.shared_cache import SQLiteSharedCache
+        path = str(tmp_path / "shared_cache.db")
+        worker_a = HBnBFacade({"place": (10, 60)}, SQLiteSharedCache(path, version_ttl=0))
+        worker_b = HBnBFacade({"place": (10, 60)}, SQLiteSharedCache(path, version_ttl=0))
+        with application.app_context():
+            db.session.execute(db.text("UPDATE places SET review_count = 0"))
+            db.session.commit()
+            assert worker_b.get_place(shared_data.place_id).review_count == 0
+            worker_a.repair_place_ratings()
+            assert worker_b.get_place(shared_data.place_id).review_count == 2
+
+    def test_conditional_requests(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        assert shared_data.place_id != None
+        urls = [f"/api/v1/places/{shared_data.place_id}", "/api/v1/places/", f"/api/v1/reviews/{shared_data.review_id}"]
+
+        responses = [auth_client.get(url) for url in urls]
+        etags = [response.headers["ETag"] for response in responses]
+        assert all(response.headers.get("Last-Modified") for response in responses)
+
+        for url, etag in zip(urls, etags):
+            response = auth_client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.data == b""
+            assert response.headers["ETag"] == etag
+
+        assert auth_client.get(urls[0], headers={"If-None-Match": '"stale"'}).status_code == 200
+        assert auth_client.get(f"{urls[0]}?expand=user").headers["ETag"] != etags[0]
+
+        review = auth_client.get(urls[2]).get_json()
+        auth_client.put(urls[2], json=dict(shared_data.review_payload, rating=review["rating"] % 5 + 1))
+        for url, etag in zip(urls, etags):
+            check_response(auth_client.get(url, headers={"If-None-Match": etag}), status_code=200)
+        auth_client.put(urls[2], json=dict(shared_data.review_payload, rating=review["rating"]))
+
     def test_modify_review(self, auth_client: AuthenticatedClient, shared_data: SharedData):
         assert shared_data.place_id != None
         shared_data.review_payload["text"] = "Why are you gay?"
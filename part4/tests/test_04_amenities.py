@@ -2,6 +2,7 @@
 Testing amenities endpoint
 """
 from utils import *
+from app import db
 
 class TestAmenities:
     def test_create_amenity(self, auth_client: AuthenticatedClient, shared_data: SharedData):
@@ -43,6 +44,69 @@ class TestAmenities:
             partial_match=True
         )
 
+    def test_transaction_rollback(self, auth_client: AuthenticatedClient, application, shared_data: SharedData):
+        from app import facade
+
+        with application.app_context():
+            with pytest.raises(RuntimeError):
+                with facade.transaction():
+                    committed = facade.create_amenity({"name": "Rolled back"})
+                    with facade.transaction():
+                        facade.update_amenity(shared_data.amenity_id, {"name": "Rolled back too"})
+                    raise RuntimeError("abort the unit of work")
+
+            assert facade.get_amenity(committed.id) == None
+            assert facade.get_amenity(shared_data.amenity_id).name == shared_data.amenities_payload["name"]
+
+    def test_amenity_cache(self, auth_client: AuthenticatedClient, application, shared_data: SharedData):
+        from app import facade
+        cache = facade.caches["amenity"]
+        url = f"/api/v1/amenities/{shared_data.amenity_id}"
+
+        auth_client.get(url)
+        hits = cache.hits
+        with application.app_context():
+            engine = db.engine
+        with QueryCounter(engine) as counter:
+            check_response(auth_client.get(url), status_code=200)
+        assert cache.hits == hits + 1
+        assert counter.count == 0
+
+        auth_client.put(url, json={"name": "Cached"})
+        check_response(auth_client.get(url), status_code=200, expected_payload=[{"name": "Cached"}], partial_match=True)
+        auth_client.put(url, json=shared_data.amenities_payload)
+
+    def test_shared_cache(self, application, shared_data: SharedData, tmp_path):
+        from app.services import HBnBFacade
+        from app.services.shared_cache import SQLiteSharedCache
+
+        path = str(tmp_path / "shared_cache.db")
+        entity_cache = {"amenity": (10, 60)}
+        worker_a = HBnBFacade(entity_cache, SQLiteSharedCache(path, version_ttl=0))
+        worker_b = HBnBFacade(entity_cache, SQLiteSharedCache(path, version_ttl=0))
+
+        with application.app_context():
+            name = worker_a.get_amenity(shared_data.amenity_id).name
+            assert worker_b.get_amenity(shared_data.amenity_id).name == name
+            assert worker_b.caches["amenity"].misses == 1
+            shared = worker_b.shared_cache.get(f"amenity:{shared_data.amenity_id}:0")
+            assert shared.name == name and shared.created_at == worker_a.get_amenity(shared_data.amenity_id).created_at
+
+            worker_a.update_amenity(shared_data.amenity_id, {"name": "Shared"})
+            assert worker_b.get_amenity(shared_data.amenity_id).name == "Shared"
+            worker_a.update_amenity(shared_data.amenity_id, {"name": name})
+
+        # The values are stored as JSON, and the versions read are kept for version_ttl seconds
+        lagging = SQLiteSharedCache(path, version_ttl=60)
+        key = f"amenity:{shared_data.amenity_id}"
+        version = lagging.version(key)
+        worker_a.shared_cache.bump(key)
+        assert lagging.version(key) == version
+        lagging.bump(key)
+        assert lagging.version(key) == version + 2
+        row = lagging._connection().execute("SELECT value FROM entries LIMIT 1").fetchone()
+        assert json.loads(row[0])["__snapshot__"]["id"] == shared_data.amenity_id
+
     def test_modify_amenity(self, auth_client: AuthenticatedClient, shared_data: SharedData):
         assert shared_data.amenity_id != None
 
@@ -62,11 +126,96 @@ class TestAmenities:
             partial_match=True
         )
 
-    def test_add_amenity_to_place(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+    def test_add_amenity_to_place(self, auth_client: AuthenticatedClient, application, shared_data: SharedData):
+        from types import SimpleNamespace
+        from app import facade
         assert shared_data.amenity_id != None
 
         check_response(
             auth_client.post(f"/api/v1/places/{shared_data.place_id}/add_amenity/{shared_data.amenity_id}"),
             status_code=200,
             expected_payload=[{ "message": "Add amenity to place" }]
-        )
\ No newline at end of file
+        )
+        check_response(auth_client.post(f"/api/v1/places/{shared_data.place_id}/add_amenity/unknown"), status_code=404)
+
+        # The amenity was deleted by another worker after the route looked it up
+        with application.app_context():
+            place = facade.get_place(shared_data.place_id)
+            assert facade.add_amenity_to_place(place, SimpleNamespace(id="deleted")) is None
+
+    def test_filter_places_by_amenities(self, auth_client: AuthenticatedClient, shared_data: SharedData):
+        assert shared_data.amenity_id != None
+        first, second = shared_data.amenity_id, shared_data.amenities[0]["id"]
+
+        result = check_response(auth_client.get(f"/api/v1/places/by_amenities?amenities={first}"), status_code=200)
+        assert [place["id"] for place in result["items"]] == [shared_data.place_id]
+        assert result["total"] == 1
+        assert result["facets"] == {first: 1}
+
+        new_place = auth_client.post("/api/v1/places/", json=shared_data.place_payload).get_json()
+        auth_client.post(f"/api/v1/places/{new_place['id']}/add_amenity/{first}")
+        auth_client.post(f"/api/v1/places/{new_place['id']}/add_amenity/{second}")
+
+        result = check_response(auth_client.get(f"/api/v1/places/by_amenities?amenities={first},{second}"), status_code=200)
+        assert [place["id"] for place in result["items"]] == [new_place["id"]]
+        assert result["facets"] == {first: 1, second: 1}
+
+        first_page = auth_client.get(f"/api/v1/places/by_amenities?amenities={first},{second}&amenities_match=any&limit=1")
+        result = check_response(first_page, status_code=200)
+        assert [place["id"] for place in result["items"]] == [shared_data.place_id]
+        assert result["total"] == 2
+        assert result["facets"] == {first: 2, second: 1}
+
+        cursor = first_page.headers.get("X-Next-Cursor")
+        assert cursor != None
+        result = check_response(
+            auth_client.get(f"/api/v1/places/by_amenities?amenities={first},{second}&amenities_match=any&limit=1&cursor={cursor}"),
+            status_code=200
+        )
+        assert [place["id"] for place in result["items"]] == [new_place["id"]]
+
+        price = shared_data.place_payload["price"]
+        result = auth_client.get(f"/api/v1/places/by_amenities?amenities={first}&max_price={price - 1}").get_json()
+        assert result["items"] == []
+
+        # Half of the ordinals unused once the place is deleted: the index is rebuilt without it
+        from app import facade
+        index = facade.amenity_index
+        index.COMPACT_MIN_REMOVED = 1
+        try:
+            auth_client.delete(f"/api/v1/places/{new_place['id']}")
+            assert not index.loaded
+            result = check_response(auth_client.get(f"/api/v1/places/by_amenities?amenities={second}"), status_code=200)
+            assert result["items"] == [] and result["total"] == 0
+            assert index.loaded and len(index._keys) == 1
+        finally:
+            del index.COMPACT_MIN_REMOVED
+
+        check_response(auth_client.get("/api/v1/places/by_amenities?amenities=,"), status_code=400)
+
+    def test_amenity_index_signal(self, application, shared_data: SharedData, tmp_path):
+        from app.services import HBnBFacade
+        from app.services.generation import GenerationCounter
+
+        # Two worker processes of a host, sharing the counter file
+        path = str(tmp_path / "places.generation")
+        worker_a = HBnBFacade(places_signal=GenerationCounter(path))
+        worker_b = HBnBFacade(places_signal=GenerationCounter(path))
+        amenity_id = shared_data.amenity_id
+        lat, lng = -shared_data.place_payload["latitude"], -shared_data.place_payload["longitude"]
+
+        with application.app_context():
+            for worker in (worker_a, worker_b):
+                assert worker.filter_places_by_amenities([amenity_id], True, 10)[2] == 1
+
+            place = worker_a.create_place(dict(shared_data.place_payload, latitude=lat, longitude=lng, owner=shared_data.user_id))
+            worker_a.add_amenity_to_place(place, worker_a.get_amenity(amenity_id))
+
+            # The writer updated its own index in place, it does not reload it
+            worker_a._sync_place_indexes()
+            assert worker_a.amenity_index.loaded
+
+            assert worker_b.filter_places_by_amenities([amenity_id], True, 10)[2] == 2
+
+            worker_a.delete_place_cascade(place.id)
+            assert worker_b.filter_places_by_amenities([amenity_id], True, 10)[2] == 1
@@ -24,11 +24,20 @@ class TestAdmin:
         assert shared_data.token != None
         check_response(auth_client.post("/api/v1/admin/users/", json={}), status_code=403, expected_payload=[{ "error": "Admin privileges required" }])
 
+        # The is_admin claim of a token is not trusted, the flag is read from the database
         with application.app_context():
-            fake_admin_token = create_access_token(identity={"id": "???", "is_admin": True})
+            fake_admin_token = create_access_token(identity={"id": shared_data.user_id, "is_admin": True})
+        check_response(AuthenticatedClient(client, fake_admin_token).post("/api/v1/admin/users/", json=admin_user_payload), status_code=403)
+
+        # The first admin is created out of the API
+        bootstrap_admin = dict(admin_user_payload, email="bootstrap.admin@gmail.com")
+        with application.app_context():
+            from app import facade
+            facade.create_user(dict(bootstrap_admin, is_admin=True))
+        result = client.post("/api/v1/auth/login", json=dict_without_keys(bootstrap_admin, ["first_name", "last_name"])).get_json()
 
         global auth_admin
-        auth_admin = AuthenticatedClient(client, fake_admin_token)
+        auth_admin = AuthenticatedClient(client, result["access_token"])
 
         result = check_response(
             auth_admin.post("/api/v1/admin/users/", json=admin_user_payload),
@@ -99,6 +108,22 @@ class TestAdmin:
 
         shared_data.amenities.append({ "id": result["id"], "data": new_amenity })
 
+    def test_admin_bulk_create_amenities(self, client: FlaskClient, auth_client: AuthenticatedClient, shared_data: SharedData):
+        assert auth_admin != None
+        check_response(auth_client.post("/api/v1/admin/amenities/bulk", json=[]), status_code=403, expected_payload=[{ "error": "Admin privileges required" }])
+
+        result = check_response(
+            auth_admin.post("/api/v1/admin/amenities/bulk", json=[{"name": "Pool"}, {"name": "x" * 51}, {}]),
+            status_code=207
+        )
+        assert [item["status"] for item in result] == [201, 400, 400]
+
+        check_response(
+            auth_admin.get(f"/api/v1/amenities/{result[0]['id']}"),
+            status_code=200,
+            expected_payload=[{"name": "Pool"}]
+        )
+
     def test_admin_modify_amenity(self, client: FlaskClient, auth_client: AuthenticatedClient, shared_data: SharedData):
         assert auth_admin != None
         current_amenity = shared_data.amenities[1]
@@ -188,4 +213,30 @@ class TestAdmin:
         assert r2 not in reviews
 
         assert a1 not in amenities
-        assert a2 not in amenities
\ No newline at end of file
+        assert a2 not in amenities
+
+        check_response(auth_client.get(f"/api/v1/reviews/{r1}"), status_code=404)
+        check_response(auth_client.get(f"/api/v1/amenities/{a1}"), status_code=200)
+
+    def test_verified_token_cache(self, client: FlaskClient, auth_client: AuthenticatedClient, application):
+        from app import jwt
+        from datetime import timedelta
+        cache = jwt.verified_tokens
+
+        check_response(auth_admin.get("/api/v1/auth/protected"), status_code=200)
+        hits = cache.hits
+        check_response(auth_admin.get("/api/v1/auth/protected"), status_code=200)
+        assert cache.hits == hits + 1
+
+        with application.app_context():
+            expired_token = create_access_token(identity={"id": admin_id, "is_admin": True}, expires_delta=timedelta(seconds=-1))
+        size = len(cache)
+        check_response(AuthenticatedClient(client, expired_token).get("/api/v1/auth/protected"), status_code=401)
+        tampered_token = auth_admin.token[:-2] + ("AA" if auth_admin.token[-2:] != "AA" else "BB")
+        check_response(AuthenticatedClient(client, tampered_token).get("/api/v1/auth/protected"), status_code=422)
+        assert len(cache) == size
+
+        result = check_response(auth_admin.get("/api/v1/admin/stats"), status_code=200)
+        assert 0 < result["verified_tokens"]["hit_rate"] <= 1
+        assert set(result["caches"]) == {"user", "place", "amenity", "principal"}
+        check_response(auth_client.get("/api/v1/admin/stats"), status_code=403)
@@ -4,6 +4,7 @@ from flask import Response
 from dataclasses import dataclass, field
 from datetime import datetime
 from functools import wraps
+from sqlalchemy import event
 import pytest
 import json
 
@@ -31,6 +32,22 @@ class AuthenticatedClient:
     def delete(self, *args, **kwargs):
         return self.client.delete(*args, **self._add_auth_header(kwargs))
 
+class QueryCounter:
+    """Count the SQL statements executed on the database while in the with block"""
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
 class SharedData:
     def __init__(self):
         self.user_id: int = None